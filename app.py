@@ -3,25 +3,30 @@ UniLife OS — 主入口 (Phase 2: Agent + 持久化 + UI 优化)
 新增：AI Agent 工具调用、数据持久化、清除对话、API 缺失提示、工具调用可视化
 """
 import html as html_mod
+import uuid
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from datetime import datetime
-from modules.chat_engine import chat_agent, trim_messages
+from modules.chat_engine import (
+    chat_agent, trim_messages, MAX_CONTEXT_MESSAGES,
+    get_scheduler_stats, get_llm_coalesce_stats, get_tier_stats,
+)
 from modules.mock_data import (
     get_finance, get_health, get_todos,
     get_upcoming_exams, get_schedule, get_today_schedule,
     get_travel_plan, get_alerts, build_context_summary,
 )
-from modules.tools import TOOL_SCHEMAS, TOOL_DISPLAY_NAMES, execute_tool
+from modules.records import ItineraryStop, Weekday
+from modules.charts import finance_pie, steps_line, sleep_bar, get_chart_cache_stats
+from modules.tools import TOOL_SCHEMAS, TOOL_DISPLAY_NAMES, execute_tool, get_tool_coalesce_stats
 from modules.persistence import (
     update_todo_status, add_expense, increment_water,
     log_exercise, log_mood, update_packing,
-    save_chat_history, load_chat_history, clear_chat_history,
+    load_chat_page, append_chat_messages, clear_chat_history,
+    compact_tool_log, tool_log_result,
     get_packing_checked, set_budget, set_exercise_goal,
 )
 from prompts.system_prompt import build_system_prompt
-from config import APP_NAME, APP_ICON, DEEPSEEK_API_KEY
+from config import APP_NAME, APP_ICON, DEEPSEEK_API_KEY, DEBUG_METRICS
 
 # ========== 页面配置 ==========
 st.set_page_config(
@@ -64,6 +69,14 @@ st.markdown("""
     .alert-card-high p, .alert-card-medium p, .alert-card-low p {
         margin: 0; font-size: 0.85rem; opacity: 0.95;
     }
+    /* 提醒卡片网格：一个 HTML 块渲染一排卡片，窄屏自动换行 */
+    .alert-grid {
+        display: grid; gap: 1rem;
+        grid-template-columns: repeat(auto-fit, minmax(220px, 1fr));
+    }
+    .alert-grid .alert-card-high, .alert-grid .alert-card-medium, .alert-grid .alert-card-low {
+        margin-bottom: 0;
+    }
     .travel-item {
         border-left: 3px solid #667eea;
         padding: 0.5rem 0 0.5rem 1rem;
@@ -106,18 +119,15 @@ st.markdown("""
         border-color: rgba(139,92,246,0.40);
         box-shadow: 0 2px 8px rgba(139,92,246,0.15);
     }
-    /* Tab 导航：胶囊式按钮 */
-    [data-testid="stTabs"] [data-baseweb="tab-list"] {
-        gap: 0.5rem;
-        border-bottom: none !important;
-    }
-    [data-testid="stTabs"] button[data-baseweb="tab"] {
+    /* 视图切换：胶囊式按钮 */
+    [data-testid="stMainBlockContainer"] [data-testid="stButtonGroup"] button[kind^="segmented_control"] {
         border-radius: 10px;
         padding: 0.55rem 1.8rem;
         font-weight: 600;
         border: 1px solid rgba(102,126,234,0.25);
+        margin-right: 0.5rem;
     }
-    [data-testid="stTabs"] button[aria-selected="true"] {
+    [data-testid="stMainBlockContainer"] [data-testid="stButtonGroup"] button[kind="segmented_controlActive"] {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
         color: white !important;
         border: none !important;
@@ -125,12 +135,12 @@ st.markdown("""
     }
     .stChatMessage { border-radius: 12px !important; }
     /* 聊天滚动容器：去除默认边框，自适应高度 */
-    [data-testid="stTabs"] [data-testid="stVerticalBlockBorderWrapper"]:has([data-testid="stChatMessage"]) {
+    [data-testid="stMainBlockContainer"] [data-testid="stVerticalBlockBorderWrapper"]:has([data-testid="stChatMessage"]) {
         border: none !important;
         height: calc(100vh - 280px) !important;
         min-height: 350px;
     }
-    [data-testid="stTabs"] [data-testid="stVerticalBlockBorderWrapper"]:has([data-testid="stChatMessage"]) > div {
+    [data-testid="stMainBlockContainer"] [data-testid="stVerticalBlockBorderWrapper"]:has([data-testid="stChatMessage"]) > div {
         height: 100% !important;
     }
 </style>
@@ -153,16 +163,55 @@ if ('serviceWorker' in navigator) {
 """, unsafe_allow_html=True)
 
 
-def _toast_and_rerun(msg: str, icon: str = "✅"):
-    """暂存 toast 消息到 session_state，rerun 后在 main() 顶部显示。"""
+def _queue_toast(msg: str, icon: str = "✅", dashboard: bool = False):
+    """
+    控件回调里暂存 toast 消息，由回调之后的那次渲染入口（main 或 fragment）显示。
+    回调在脚本执行前运行，页面直接以最新数据渲染一次，无需再 st.rerun()。
+    dashboard: 该修改会影响数据看板上的面板（如记账 / 改预算影响消费构成与消费指标）。
+    """
     st.session_state._pending_toast = (msg, icon)
-    st.rerun()
+    # 修改影响了智能提醒，或影响了正在显示的看板面板 → 标记需要整页刷新
+    if _alerts_signature() != st.session_state.get("_alerts_sig"):
+        st.session_state._full_rerun_pending = True
+    elif dashboard and st.session_state.get("active_view") == _DASHBOARD_VIEW:
+        st.session_state._full_rerun_pending = True
+
+
+def _fragment_prelude():
+    """
+    交互型 fragment 的入口：若回调改变了智能提醒或看板面板而本次只是 fragment 重跑，升级为整页 rerun；
+    否则显示暂存的 toast。
+    """
+    if st.session_state.pop("_full_rerun_pending", False) and not st.session_state.get("_full_run_active"):
+        st.rerun(scope="app")
+    _show_pending_toast()
+
+
+def _show_pending_toast():
+    """显示回调暂存的 toast 消息（整页与 fragment 重跑共用）。"""
+    if "_pending_toast" in st.session_state:
+        msg, icon = st.session_state._pending_toast
+        st.toast(msg, icon=icon)
+        del st.session_state._pending_toast
+
+
+def _alerts_signature(alerts: list[dict] | None = None) -> tuple:
+    """智能提醒的内容签名，用于判断一次修改是否需要刷新提醒卡片。"""
+    if alerts is None:
+        alerts = get_alerts()
+    return tuple((a["title"], a["message"]) for a in alerts)
+
+
+_ALERT_SEVERITIES = ("high", "medium", "low")
 
 
 def _alert_card_html(severity, icon, title, message):
+    # message 由 get_alerts 生成，自带 <strong> 且其中的用户数据已转义；其余字段在此转义
+    if severity not in _ALERT_SEVERITIES:
+        severity = "low"
     return (
         f'<div class="alert-card-{severity}">'
-        f'<h4>{icon} {title}</h4>'
+        f'<h4>{html_mod.escape(icon)} {html_mod.escape(title)}</h4>'
         f'<p>{message}</p>'
         f'</div>'
     )
@@ -171,12 +220,35 @@ def _alert_card_html(severity, icon, title, message):
 def _travel_item_html(icon, time_str, activity, location, cost_str):
     return (
         f'<div class="travel-item">'
-        f'<strong>{icon} {time_str}</strong> — {activity}<br>'
-        f'<small>📍 {location} 💰 {cost_str}</small>'
+        f'<strong>{html_mod.escape(icon)} {html_mod.escape(time_str)}</strong>'
+        f' — {html_mod.escape(activity)}<br>'
+        f'<small>📍 {html_mod.escape(location)} 💰 {html_mod.escape(cost_str)}</small>'
         f'</div>'
     )
 
 
+# 整段 HTML 按内容缓存：同样的提醒 / 行程直接复用拼好的字符串，且每段只发一条 markdown delta
+@st.cache_data(show_spinner=False, max_entries=64)
+def _alert_grid_html(alerts: list[dict]) -> str:
+    cards = "".join(
+        _alert_card_html(a.get("severity", "low"), a["icon"], a["title"], a["message"])
+        for a in alerts
+    )
+    return '<div class="alert-grid">' + cards + '</div>'
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _travel_timeline_html(itinerary: list[ItineraryStop]) -> str:
+    items = []
+    for stop in itinerary:
+        cost_str = "¥" + str(int(stop.cost)) if stop.cost > 0 else "免费"
+        items.append(_travel_item_html(
+            stop.icon, stop.time, stop.activity,
+            stop.location, cost_str,
+        ))
+    return "".join(items)
+
+
 # ========== 侧边栏 ==========
 def render_sidebar():
     with st.sidebar:
@@ -191,204 +263,279 @@ def render_sidebar():
             st.info("在项目根目录创建 `.env` 文件，添加：\n`DEEPSEEK_API_KEY=你的密钥`")
 
         st.divider()
+        _render_sidebar_courses()
+        st.divider()
+        _render_sidebar_finance()
+        st.divider()
+        _render_sidebar_health()
+        st.divider()
+        _render_sidebar_todos()
+        st.divider()
+        _render_sidebar_exams()
+        st.divider()
 
-        # 今日课程
-        today_courses = get_today_schedule()
-        weekday_map = {0: "周一", 1: "周二", 2: "周三", 3: "周四", 4: "周五", 5: "周六", 6: "周日"}
-        today_wd = weekday_map[datetime.now().weekday()]
-
-        st.markdown("### 📅 今日课程（" + today_wd + "）")
-        if today_courses:
-            for c in today_courses:
-                type_badge = "🧪" if c.get("type") == "实验" else "📖"
-                line = type_badge + " **" + c["course"] + "**  \n⏰ " + c["time"] + "  📍 " + c["location"]
-                st.markdown(line)
-        else:
-            st.info("🎉 今天没有课，自由安排！")
+        # 清除对话按钮（不在 fragment 内，点击即整页渲染一次）
+        st.button("🔄 清除对话", use_container_width=True, on_click=_on_clear_chat)
 
-        st.divider()
+        if DEBUG_METRICS:
+            _render_debug_metrics()
 
-        # 财务快览
-        finance = get_finance()
-        st.markdown("### 💰 财务快览")
-        remaining_str = "¥" + str(int(finance["remaining"]))
-        spent_str = "-¥" + str(int(finance["spent"])) + " 已花费"
-        st.metric(label="本月剩余", value=remaining_str, delta=spent_str, delta_color="inverse")
-        st.progress(
-            min(finance["budget_usage_pct"] / 100, 1.0),
-            text="预算使用 " + str(finance["budget_usage_pct"]) + "%",
-        )
 
-        if finance["budget_usage_pct"] > 80:
-            warn_msg = (
-                "⚠️ 预算紧张！剩余 " + str(finance["days_left_in_month"])
-                + " 天，建议每天 ≤ ¥" + str(int(finance["suggested_daily"]))
+def _render_debug_metrics():
+    """运行指标（仅 DEBUG_METRICS 开启时显示，面向开发者）"""
+    with st.expander("🛠️ 运行指标"):
+        stats = get_chart_cache_stats()
+        st.caption(
+            "📈 图表缓存命中率 " + str(round(stats["hit_rate"] * 100)) + "%"
+            + "（命中 " + str(stats["hits"]) + " / 构建 " + str(stats["misses"]) + " 次，"
+            + "平均构建 " + str(round(stats["avg_build_ms"], 1)) + " ms）"
+        )
+        sched = get_scheduler_stats()
+        st.caption(
+            "🚦 LLM 排队：放行 " + str(sched["admitted"]) + " 次，超时 " + str(sched["timed_out"]) + " 次，"
+            + "平均等待 " + str(round(sched["avg_wait"] * 1000)) + " ms / 最长 "
+            + str(round(sched["max_wait"] * 1000)) + " ms，排队中 " + str(sched["queued"])
+            + "，在途 " + str(sched["in_flight"])
+        )
+        st.caption(
+            "🔗 请求合并：LLM " + str(get_llm_coalesce_stats()["coalesced"])
+            + " 次，只读工具 " + str(get_tool_coalesce_stats()["coalesced"]) + " 次"
+        )
+        for tier, t in get_tier_stats().items():
+            st.caption(
+                "🧭 " + tier + " 档：" + str(t["turns"]) + " 轮，平均延迟 "
+                + str(round(t["avg_latency"], 2)) + " s，平均 " + str(round(t["avg_tokens"])) + " tokens"
             )
-            st.warning(warn_msg)
-
-        with st.expander("📋 最近消费流水"):
-            for t in finance["recent_transactions"][:8]:
-                t_icon = t.get("icon", "💳")
-                safe_item = html_mod.escape(t["item"])
-                safe_cat = html_mod.escape(t["category"])
-                line = (
-                    t_icon + " <strong>" + safe_item + "</strong> — ¥" + str(t["amount"])
-                    + "  <br><small>" + t["date"] + " · " + safe_cat + "</small>"
-                )
-                st.markdown(line, unsafe_allow_html=True)
-
-        with st.expander("✏️ 快速记一笔"):
-            with st.form("quick_expense", clear_on_submit=True):
-                form_cols = st.columns([2, 1])
-                with form_cols[0]:
-                    item = st.text_input("花了什么", placeholder="奶茶")
-                with form_cols[1]:
-                    amount = st.number_input("金额", min_value=0.0, step=0.5, format="%.1f")
-                category = st.selectbox("分类", ["餐饮", "交通", "购物", "学习用品", "娱乐", "其他"])
-                submitted = st.form_submit_button("📝 记录")
-                if submitted:
-                    if not item or amount <= 0:
-                        st.warning("⚠️ 请填写消费项目并输入大于 0 的金额")
-                    else:
-                        add_expense(item, amount, category)
-                        _toast_and_rerun("✅ 已记录：" + item + " ¥" + str(amount) + "（" + category + "）", "💾")
 
-        with st.expander("⚙️ 预算设置"):
-            new_budget = st.number_input(
-                "月预算 (元)", value=float(finance["monthly_budget"]),
-                min_value=100.0, step=100.0, format="%.0f",
-            )
-            if st.button("保存预算"):
-                set_budget(new_budget)
-                _toast_and_rerun("预算已更新为 ¥" + str(int(new_budget)), "💰")
 
-        st.divider()
+def _on_clear_chat():
+    st.session_state.messages = []
+    st.session_state._chat_loaded_from = 0
+    st.session_state._chat_persisted = 0
+    st.session_state._chat_window = CHAT_PAGE_SIZE
+    clear_chat_history()
+    _queue_toast("对话已清除", "🔄")
+
+
+def _render_sidebar_courses():
+    """今日课程"""
+    today_courses = get_today_schedule()
+    today_wd = Weekday.from_index(datetime.now().weekday())
+
+    st.markdown("### 📅 今日课程（" + today_wd + "）")
+    if today_courses:
+        for c in today_courses:
+            type_badge = "🧪" if c.type == "实验" else "📖"
+            line = type_badge + " **" + c.course + "**  \n⏰ " + c.time + "  📍 " + c.location
+            st.markdown(line)
+    else:
+        st.info("🎉 今天没有课，自由安排！")
+
+
+@st.fragment
+def _render_sidebar_finance():
+    """财务快览（fragment：记账 / 改预算只重跑本区块）"""
+    _fragment_prelude()
+    finance = get_finance()
+    st.markdown("### 💰 财务快览")
+    remaining_str = "¥" + str(int(finance["remaining"]))
+    spent_str = "-¥" + str(int(finance["spent"])) + " 已花费"
+    st.metric(label="本月剩余", value=remaining_str, delta=spent_str, delta_color="inverse")
+    st.progress(
+        min(finance["budget_usage_pct"] / 100, 1.0),
+        text="预算使用 " + str(finance["budget_usage_pct"]) + "%",
+    )
 
-        # 健康打卡
-        health = get_health()
-        st.markdown("### 🏥 今日健康")
+    if finance["budget_usage_pct"] > 80:
+        warn_msg = (
+            "⚠️ 预算紧张！剩余 " + str(finance["days_left_in_month"])
+            + " 天，建议每天 ≤ ¥" + str(int(finance["suggested_daily"]))
+        )
+        st.warning(warn_msg)
+
+    with st.expander("📋 最近消费流水"):
+        for t in finance["recent_transactions"][:8]:
+            safe_item = html_mod.escape(t.item)
+            safe_cat = html_mod.escape(t.category)
+            line = (
+                t.icon + " <strong>" + safe_item + "</strong> — ¥" + str(t.amount)
+                + "  <br><small>" + t.date + " · " + safe_cat + "</small>"
+            )
+            st.markdown(line, unsafe_allow_html=True)
+
+    with st.expander("✏️ 快速记一笔"):
+        with st.form("quick_expense", clear_on_submit=True):
+            form_cols = st.columns([2, 1])
+            with form_cols[0]:
+                st.text_input("花了什么", placeholder="奶茶", key="expense_item")
+            with form_cols[1]:
+                st.number_input("金额", min_value=0.0, step=0.5, format="%.1f", key="expense_amount")
+            st.selectbox("分类", ["餐饮", "交通", "购物", "学习用品", "娱乐", "其他"], key="expense_category")
+            st.form_submit_button("📝 记录", on_click=_on_add_expense)
+            if st.session_state.pop("_expense_invalid", False):
+                st.warning("⚠️ 请填写消费项目并输入大于 0 的金额")
+
+    with st.expander("⚙️ 预算设置"):
+        st.number_input(
+            "月预算 (元)", value=float(finance["monthly_budget"]),
+            min_value=100.0, step=100.0, format="%.0f", key="budget_input",
+        )
+        st.button("保存预算", on_click=_on_save_budget)
 
-        hcol1, hcol2 = st.columns(2)
-        with hcol1:
-            st.metric("步数", "{:,}".format(health["today_steps"]),
-                      delta="目标 " + "{:,}".format(health["step_goal"]))
-        with hcol2:
-            st.metric("睡眠", str(health["sleep_hours"]) + "h", delta=health["sleep_quality"])
 
-        hcol3, hcol4 = st.columns(2)
-        with hcol3:
-            st.metric("喝水", str(health["water_cups"]) + "/" + str(health["water_goal"]) + "杯")
-        with hcol4:
-            st.metric("运动", str(health["exercise_this_week"]) + "/" + str(health["exercise_goal"]) + "次")
+def _on_add_expense():
+    item = st.session_state.expense_item
+    amount = st.session_state.expense_amount
+    category = st.session_state.expense_category
+    if not item or amount <= 0:
+        st.session_state._expense_invalid = True
+        return
+    add_expense(item, amount, category)
+    _queue_toast("✅ 已记录：" + item + " ¥" + str(amount) + "（" + category + "）", "💾", dashboard=True)
+
+
+def _on_save_budget():
+    new_budget = st.session_state.budget_input
+    set_budget(new_budget)
+    _queue_toast("预算已更新为 ¥" + str(int(new_budget)), "💰", dashboard=True)
+
+
+@st.fragment
+def _render_sidebar_health():
+    """健康打卡（fragment：喝水 / 运动 / 心情只重跑本区块）"""
+    _fragment_prelude()
+    health = get_health()
+    st.markdown("### 🏥 今日健康")
+
+    hcol1, hcol2 = st.columns(2)
+    with hcol1:
+        st.metric("步数", "{:,}".format(health["today_steps"]),
+                  delta="目标 " + "{:,}".format(health["step_goal"]))
+    with hcol2:
+        st.metric("睡眠", str(health["sleep_hours"]) + "h", delta=health["sleep_quality"])
+
+    hcol3, hcol4 = st.columns(2)
+    with hcol3:
+        st.metric("喝水", str(health["water_cups"]) + "/" + str(health["water_goal"]) + "杯")
+    with hcol4:
+        st.metric("运动", str(health["exercise_this_week"]) + "/" + str(health["exercise_goal"]) + "次")
+
+    st.caption(
+        "😊 心情: " + health["mood"] + " | 🔥 连续打卡 " + str(health["checkin_streak"]) + " 天"
+    )
 
-        st.caption(
-            "😊 心情: " + health["mood"] + " | 🔥 连续打卡 " + str(health["checkin_streak"]) + " 天"
+    st.markdown("**快速打卡：**")
+    btn_cols = st.columns(3)
+    with btn_cols[0]:
+        st.button("💧+1杯", on_click=_on_add_water)
+    with btn_cols[1]:
+        exercise_done = health.get("last_exercise") == datetime.now().strftime("%Y-%m-%d")
+        btn_label = "✅ 已打卡" if exercise_done else "🏃运动"
+        st.button(btn_label, disabled=exercise_done, on_click=_on_log_exercise)
+    with btn_cols[2]:
+        mood_options = ["😊 开心", "🙂 还行", "😐 一般", "😢 难过", "😫 疲惫"]
+        st.selectbox("心情", mood_options, label_visibility="collapsed", key="mood_select")
+        st.button("📝记心情", on_click=_on_log_mood)
+
+    with st.expander("🎯 运动目标设置"):
+        goal_options = [3, 4, 5, 6, 7]
+        current_goal = health["exercise_goal"]
+        default_idx = goal_options.index(current_goal) if current_goal in goal_options else 0
+        st.selectbox(
+            "每周运动次数", goal_options,
+            index=default_idx, key="goal_select",
         )
+        st.button("保存运动目标", on_click=_on_save_exercise_goal)
 
-        st.markdown("**快速打卡：**")
-        btn_cols = st.columns(3)
-        with btn_cols[0]:
-            if st.button("💧+1杯"):
-                increment_water()
-                total = get_health()["water_cups"]
-                _toast_and_rerun("💧 喝水 +1，已喝 " + str(total) + " 杯！", "💧")
-        with btn_cols[1]:
-            exercise_done = health.get("last_exercise") == datetime.now().strftime("%Y-%m-%d")
-            btn_label = "✅ 已打卡" if exercise_done else "🏃运动"
-            if st.button(btn_label, disabled=exercise_done):
-                log_exercise()
-                _toast_and_rerun("🏃 运动打卡成功！已保存", "🎉")
-        with btn_cols[2]:
-            mood_options = ["😊 开心", "🙂 还行", "😐 一般", "😢 难过", "😫 疲惫"]
-            selected_mood = st.selectbox("心情", mood_options, label_visibility="collapsed", key="mood_select")
-            if st.button("📝记心情"):
-                log_mood(selected_mood)
-                _toast_and_rerun(selected_mood + " 心情记录成功！", "✨")
-
-        with st.expander("🎯 运动目标设置"):
-            goal_options = [3, 4, 5, 6, 7]
-            current_goal = health["exercise_goal"]
-            default_idx = goal_options.index(current_goal) if current_goal in goal_options else 0
-            new_goal = st.selectbox(
-                "每周运动次数", goal_options,
-                index=default_idx,
-            )
-            if st.button("保存运动目标"):
-                set_exercise_goal(new_goal)
-                _toast_and_rerun("运动目标已更新为每周 " + str(new_goal) + " 次", "🎯")
 
-        st.divider()
+def _on_add_water():
+    increment_water()
+    total = get_health()["water_cups"]
+    _queue_toast("💧 喝水 +1，已喝 " + str(total) + " 杯！", "💧")
 
-        # 待办事项（可勾选）
-        todos = get_todos()
-        pending = [t for t in todos if not t["done"]]
-        done_todos = [t for t in todos if t["done"]]
 
-        st.markdown("### 📝 待办事项 (" + str(len(pending)) + ")")
+def _on_log_exercise():
+    log_exercise()
+    _queue_toast("🏃 运动打卡成功！已保存", "🎉")
 
-        # 每次渲染同步最新待办状态（兼容 Agent 新增/修改的待办）
-        st.session_state.todo_done = {t["id"]: t["done"] for t in todos}
 
-        # 只显示未完成的待办
-        for t in pending:
-            label = t["priority"] + " " + t["task"] + "（" + t["deadline"] + "）"
-            checked = st.checkbox(
-                label,
-                value=False,
-                key="todo_" + str(t["id"]),
-            )
-            if checked and not st.session_state.todo_done.get(t["id"]):
-                st.session_state.todo_done[t["id"]] = True
-                update_todo_status(t["id"], True)
-                _toast_and_rerun("✅ 完成：" + t["task"], "🎉")
-
-        if not pending:
-            st.info("🎉 所有待办已完成！")
-
-        # 已完成待办折叠区，图标置灰
-        if done_todos:
-            _gray_priority = {"🔴": "🔘", "🟡": "🔘", "🟢": "🔘"}
-            with st.expander("✅ 已完成 (" + str(len(done_todos)) + ")", expanded=False):
-                for t in done_todos:
-                    gray_label = t["priority"]
-                    for color, gray in _gray_priority.items():
-                        gray_label = gray_label.replace(color, gray)
-                    label = gray_label + " ~~" + t["task"] + "~~（" + t["deadline"] + "）"
-                    unchecked = st.checkbox(
-                        label,
-                        value=True,
-                        key="todo_" + str(t["id"]),
-                    )
-                    if not unchecked and st.session_state.todo_done.get(t["id"], True):
-                        st.session_state.todo_done[t["id"]] = False
-                        update_todo_status(t["id"], False)
-                        _toast_and_rerun("↩️ 已恢复：" + t["task"], "🔄")
+def _on_log_mood():
+    mood = st.session_state.mood_select
+    log_mood(mood)
+    _queue_toast(mood + " 心情记录成功！", "✨")
 
-        st.divider()
 
-        # 考试倒计时
-        exams = get_upcoming_exams()
-        if exams:
-            st.markdown("### 🎯 考试倒计时")
-            for e in exams:
-                countdown = "今天！" if e["days_left"] == 0 else str(e["days_left"]) + " 天后"
-                msg = "**" + e["course"] + "** — " + countdown + "\n📍 " + e["location"]
-                if e["days_left"] == 0:
-                    st.error("🔴 " + msg)
-                elif e["days_left"] <= 3:
-                    st.error("🔴 " + msg + "！")
-                elif e["days_left"] <= 7:
-                    st.warning("🟡 " + msg)
-                else:
-                    st.info("🔵 " + msg)
+def _on_save_exercise_goal():
+    goal = st.session_state.goal_select
+    set_exercise_goal(goal)
+    _queue_toast("运动目标已更新为每周 " + str(goal) + " 次", "🎯")
 
-        st.divider()
 
-        # 清除对话按钮
-        if st.button("🔄 清除对话", use_container_width=True):
-            st.session_state.messages = []
-            clear_chat_history()
-            _toast_and_rerun("对话已清除", "🔄")
+@st.fragment
+def _render_sidebar_todos():
+    """待办事项（fragment：勾选只重跑本区块）"""
+    _fragment_prelude()
+    todos = get_todos()
+    pending = [t for t in todos if not t.done]
+    done_todos = [t for t in todos if t.done]
+
+    st.markdown("### 📝 待办事项 (" + str(len(pending)) + ")")
+
+    # 只显示未完成的待办
+    for t in pending:
+        label = t.priority + " " + t.task + "（" + t.deadline + "）"
+        st.checkbox(
+            label,
+            value=False,
+            key="todo_" + str(t.id),
+            on_change=_on_toggle_todo, args=(t.id, t.task),
+        )
+
+    if not pending:
+        st.info("🎉 所有待办已完成！")
+
+    # 已完成待办折叠区，图标置灰
+    if done_todos:
+        _gray_priority = {"🔴": "🔘", "🟡": "🔘", "🟢": "🔘"}
+        with st.expander("✅ 已完成 (" + str(len(done_todos)) + ")", expanded=False):
+            for t in done_todos:
+                gray_label = t.priority
+                for color, gray in _gray_priority.items():
+                    gray_label = gray_label.replace(color, gray)
+                label = gray_label + " ~~" + t.task + "~~（" + t.deadline + "）"
+                st.checkbox(
+                    label,
+                    value=True,
+                    key="todo_" + str(t.id),
+                    on_change=_on_toggle_todo, args=(t.id, t.task),
+                )
+
+
+def _on_toggle_todo(todo_id: int, task: str):
+    done = st.session_state["todo_" + str(todo_id)]
+    update_todo_status(todo_id, done)
+    if done:
+        _queue_toast("✅ 完成：" + task, "🎉")
+    else:
+        _queue_toast("↩️ 已恢复：" + task, "🔄")
+
+
+def _render_sidebar_exams():
+    """考试倒计时"""
+    exams = get_upcoming_exams()
+    if exams:
+        st.markdown("### 🎯 考试倒计时")
+        for e in exams:
+            countdown = "今天！" if e["days_left"] == 0 else str(e["days_left"]) + " 天后"
+            msg = "**" + e["course"] + "** — " + countdown + "\n📍 " + e["location"]
+            if e["days_left"] == 0:
+                st.error("🔴 " + msg)
+            elif e["days_left"] <= 3:
+                st.error("🔴 " + msg + "！")
+            elif e["days_left"] <= 7:
+                st.warning("🟡 " + msg)
+            else:
+                st.info("🔵 " + msg)
 
 
 # ========== 主页面头部 ==========
@@ -403,55 +550,113 @@ def render_header():
 
 
 # ========== 智能提醒卡片 ==========
+@st.fragment
 def render_alerts():
     alerts = get_alerts()
+    # 记录当前提醒签名：侧边栏 fragment 修改数据后据此决定是否需要整页刷新
+    st.session_state._alerts_sig = _alerts_signature(alerts)
     if not alerts:
         return
 
     st.markdown("### 🔔 智能提醒")
-    cols = st.columns(min(len(alerts), 3))
-    for i, alert in enumerate(alerts[:3]):
-        with cols[i % 3]:
-            severity = alert.get("severity", "low")
-            html = _alert_card_html(severity, alert["icon"], alert["title"], alert["message"])
-            st.markdown(html, unsafe_allow_html=True)
+    st.markdown(_alert_grid_html(alerts[:3]), unsafe_allow_html=True)
 
     if len(alerts) > 3:
         with st.expander("📋 查看全部 " + str(len(alerts)) + " 条提醒"):
-            for alert in alerts[3:]:
-                severity = alert.get("severity", "low")
-                html = _alert_card_html(severity, alert["icon"], alert["title"], alert["message"])
-                st.markdown(html, unsafe_allow_html=True)
+            st.markdown(_alert_grid_html(alerts[3:]), unsafe_allow_html=True)
 
 
 # ========== AI 对话（Agent 模式）==========
-def render_chat_tab():
-    # 启动时从持久化层加载聊天历史
+# 每页渲染的消息条数；首次加载不少于模型上下文条数，保证发给模型的历史不变
+CHAT_PAGE_SIZE = 20
+
+
+def _init_chat_state():
+    """
+    首次进入时只从持久化层加载最近一页历史。
+    _chat_loaded_from：messages[0] 在持久化历史中的下标（为 0 表示已无更早消息）
+    _chat_persisted：messages 中已写入持久化层的条数（之后的都是待追加的新消息）
+    _chat_window：当前渲染的最近消息条数
+    """
     if "messages" not in st.session_state:
-        saved = load_chat_history()
-        st.session_state.messages = saved if saved else []
+        page, start = load_chat_page(limit=max(CHAT_PAGE_SIZE, MAX_CONTEXT_MESSAGES))
+        st.session_state.messages = page
+        st.session_state._chat_loaded_from = start
+        st.session_state._chat_persisted = len(page)
+        st.session_state._chat_window = CHAT_PAGE_SIZE
+    # 会话 ID + 单调递增的轮次号：与 tool_call_id 一起派生写工具的幂等键。
+    # 防止的是同一轮 Agent 循环内同一个 tool_call 被重放（如循环重试、并发 rerun 重复执行）；
+    # 重新调用 LLM 会产生新的 tool_call_id，因此不会拦截用户主动重发的请求。
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state._chat_turn = 0
+
+
+def _on_load_older_messages():
+    # 先展开 session 中已有但未渲染的消息，不够再向持久化层要上一页
+    messages = st.session_state.messages
+    window = st.session_state._chat_window + CHAT_PAGE_SIZE
+    if window > len(messages) and st.session_state._chat_loaded_from > 0:
+        page, start = load_chat_page(
+            before=st.session_state._chat_loaded_from,
+            limit=window - len(messages),
+        )
+        st.session_state.messages = page + messages
+        st.session_state._chat_loaded_from = start
+        st.session_state._chat_persisted += len(page)
+    st.session_state._chat_window = window
+
+
+def _persist_new_messages():
+    """只追加尚未持久化的消息，而不是每轮重写整个历史。"""
+    pending = st.session_state.messages[st.session_state._chat_persisted:]
+    dropped = append_chat_messages(pending)
+    st.session_state._chat_persisted = len(st.session_state.messages)
+    st.session_state._chat_loaded_from = max(0, st.session_state._chat_loaded_from - dropped)
+
+
+def _render_tool_log_summary(tool_log: list[dict], key: str):
+    """历史消息的工具调用折叠为一行摘要，展开后才按引用取回并渲染各工具的返回内容。"""
+    names = [TOOL_DISPLAY_NAMES.get(tc["name"], tc["name"]) for tc in tool_log]
+    label = "🔧 调用了 " + str(len(names)) + " 个工具：" + "、".join(names)
+    if st.toggle(label, key=key):
+        for name, tc in zip(names, tool_log):
+            st.caption(name)
+            st.code(tool_log_result(tc), language=None)
+
+
+def render_chat_tab():
+    _init_chat_state()
+    messages = st.session_state.messages
+    window = st.session_state._chat_window
+    first_visible = max(0, len(messages) - window)
 
     # 可滚动消息区域（CSS 会覆盖高度为 calc(100vh - 280px)）
     chat_container = st.container(height=500)
 
     with chat_container:
-        for msg in st.session_state.messages:
+        if first_visible > 0 or st.session_state._chat_loaded_from > 0:
+            st.button("⬆️ 加载更早的消息", key="load_older_messages",
+                      on_click=_on_load_older_messages, use_container_width=True)
+
+        # 只渲染最近 window 条消息
+        for i in range(first_visible, len(messages)):
+            msg = messages[i]
             avatar = "🎓" if msg["role"] == "assistant" else "🧑‍🎓"
             with st.chat_message(msg["role"], avatar=avatar):
-                # 展示工具调用记录（如果有）
+                # 工具调用记录（如果有）折叠展示
                 tool_log = msg.get("tool_log")
                 if tool_log:
-                    for tc in tool_log:
-                        display_name = TOOL_DISPLAY_NAMES.get(tc["name"], tc["name"])
-                        with st.expander("🔧 " + display_name, expanded=False):
-                            st.code(tc["result"], language=None)
+                    # 以持久化历史中的绝对下标作 key，加载更早消息后展开状态不会错位
+                    abs_idx = st.session_state._chat_loaded_from + i
+                    _render_tool_log_summary(tool_log, key="tool_log_" + str(abs_idx))
                 st.markdown(msg["content"])
 
-        if not st.session_state.messages:
+        if not messages:
             with st.chat_message("assistant", avatar="🎓"):
                 welcome = _generate_welcome()
                 st.markdown(welcome)
-                st.session_state.messages.append({"role": "assistant", "content": welcome})
+                messages.append({"role": "assistant", "content": welcome})
 
     # 输入框在容器外部 → 始终可见
     if not DEEPSEEK_API_KEY:
@@ -464,6 +669,9 @@ def render_chat_tab():
             with st.chat_message("user", avatar="🧑‍🎓"):
                 st.markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
+        # 轮次号只增不减：与消息分页、历史压缩无关，同一会话内不会复用
+        st.session_state._chat_turn += 1
+        turn = st.session_state._chat_turn
 
         context = build_context_summary()
         system_prompt = build_system_prompt(context)
@@ -478,7 +686,8 @@ def render_chat_tab():
             with st.chat_message("assistant", avatar="🎓"):
                 with st.status("🤔 思考中...", expanded=True) as status:
                     response_text, tool_log = chat_agent(
-                        full_messages, TOOL_SCHEMAS, execute_tool
+                        full_messages, TOOL_SCHEMAS, execute_tool,
+                        session_id=st.session_state.session_id, turn=turn,
                     )
 
                     # 展示工具调用过程
@@ -497,9 +706,10 @@ def render_chat_tab():
         # 保存消息（附带工具调用记录）
         msg_record = {"role": "assistant", "content": response_text}
         if tool_log:
-            msg_record["tool_log"] = tool_log
+            # 结果正文存入 blob，session 与日志里只保留引用
+            msg_record["tool_log"] = compact_tool_log(tool_log)
         st.session_state.messages.append(msg_record)
-        save_chat_history(st.session_state.messages)
+        _persist_new_messages()
 
 
 def _generate_welcome():
@@ -537,198 +747,168 @@ def render_dashboard_tab():
     st.markdown("### 📊 个人数据看板")
 
     col1, col2 = st.columns(2)
-
     with col1:
-        st.markdown("#### 💰 消费构成")
-        finance = get_finance()
-        cat_data = pd.DataFrame(
-            list(finance["categories"].items()),
-            columns=["类别", "金额"],
-        )
-        fig = px.pie(
-            cat_data,
-            values="金额",
-            names="类别",
-            color_discrete_sequence=px.colors.qualitative.Set2,
-            hole=0.4,
-        )
-        fig.update_traces(
-            textposition="inside",
-            textinfo="percent+label",
-            hovertemplate="<b>%{label}</b><br>金额: ¥%{value:.0f}<br>占比: %{percent}<extra></extra>",
-        )
-        fig.update_layout(
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
-            margin=dict(t=20, b=20, l=20, r=20),
-            height=350,
-            dragmode=False,
-        )
-        st.plotly_chart(fig, use_container_width=True,
-            config={"displayModeBar": False, "scrollZoom": False})
-
-        st.markdown("**📈 消费指标**")
-        m1, m2, m3 = st.columns(3)
-        with m1:
-            st.metric("日均消费", "¥" + str(int(finance["daily_avg_spent"])))
-        with m2:
-            st.metric("剩余天数", str(finance["days_left_in_month"]) + "天")
-        with m3:
-            st.metric("建议日限", "¥" + str(int(finance["suggested_daily"])))
-
+        _render_finance_panel()
     with col2:
-        st.markdown("#### 📅 本周课表")
-        df = pd.DataFrame(get_schedule())
-        st.dataframe(
-            df[["weekday", "time", "course", "location", "type"]].rename(
-                columns={
-                    "weekday": "星期",
-                    "time": "时间",
-                    "course": "课程",
-                    "location": "地点",
-                    "type": "类型",
-                }
-            ),
-            use_container_width=True,
-            hide_index=True,
-        )
+        _render_schedule_panel()
 
     st.divider()
 
     col3, col4 = st.columns(2)
-
     with col3:
-        st.markdown("#### 🏥 7 天健康趋势")
-        health = get_health()
-        history = health.get("history", [])
-        if history:
-            df_health = pd.DataFrame(history)
-            df_health["date"] = pd.to_datetime(df_health["date"])
-            df_health = df_health.sort_values("date")
-
-            st.markdown("**👣 每日步数**")
-            fig_steps = px.line(
-                df_health,
-                x="date",
-                y="steps",
-                markers=True,
-                labels={"date": "日期", "steps": "步数"},
-            )
-            fig_steps.add_hline(
-                y=health["step_goal"],
-                line_dash="dash",
-                line_color="red",
-                annotation_text="目标 " + "{:,}".format(health["step_goal"]),
-            )
-            fig_steps.update_layout(
-                margin=dict(t=20, b=20, l=20, r=20),
-                height=250,
-                showlegend=False,
-                dragmode=False,
-            )
-            st.plotly_chart(fig_steps, use_container_width=True,
-                config={"displayModeBar": False, "scrollZoom": False})
-
-            st.markdown("**😴 每日睡眠**")
-            fig_sleep = px.bar(
-                df_health,
-                x="date",
-                y="sleep",
-                labels={"date": "日期", "sleep": "睡眠(小时)"},
-                color="sleep",
-                color_continuous_scale=["#ff6b6b", "#ffa502", "#7bed9f"],
-            )
-            fig_sleep.add_hline(
-                y=7,
-                line_dash="dash",
-                line_color="green",
-                annotation_text="建议 7h",
-            )
-            fig_sleep.update_layout(
-                margin=dict(t=20, b=20, l=20, r=20),
-                height=250,
-                showlegend=False,
-                coloraxis_showscale=False,
-                dragmode=False,
-            )
-            st.plotly_chart(fig_sleep, use_container_width=True,
-                config={"displayModeBar": False, "scrollZoom": False})
-        else:
-            st.info("暂无历史健康数据")
-
+        _render_health_panel()
     with col4:
-        st.markdown("#### 🗺️ 旅行计划")
-        travel = get_travel_plan()
+        _render_travel_panel()
+
+
+def _render_finance_panel():
+    st.markdown("#### 💰 消费构成")
+    finance = get_finance()
+    fig = finance_pie(finance["categories"])
+    st.plotly_chart(fig, use_container_width=True,
+        config={"displayModeBar": False, "scrollZoom": False})
+
+    st.markdown("**📈 消费指标**")
+    m1, m2, m3 = st.columns(3)
+    with m1:
+        st.metric("日均消费", "¥" + str(int(finance["daily_avg_spent"])))
+    with m2:
+        st.metric("剩余天数", str(finance["days_left_in_month"]) + "天")
+    with m3:
+        st.metric("建议日限", "¥" + str(int(finance["suggested_daily"])))
+
+
+def _render_schedule_panel():
+    import pandas as pd  # 延迟导入：只有打开数据看板时才加载 pandas
+
+    st.markdown("#### 📅 本周课表")
+    df = pd.DataFrame([c.to_dict() for c in get_schedule()])
+    st.dataframe(
+        df[["weekday", "time", "course", "location", "type"]].rename(
+            columns={
+                "weekday": "星期",
+                "time": "时间",
+                "course": "课程",
+                "location": "地点",
+                "type": "类型",
+            }
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
 
-        if travel is None:
-            st.info("暂无旅行计划，可以通过 AI 对话创建新的旅行计划。")
+
+def _render_health_panel():
+    st.markdown("#### 🏥 7 天健康趋势")
+    health = get_health()
+    history = health.get("history", [])
+    if history:
+        st.markdown("**👣 每日步数**")
+        fig_steps = steps_line(history, health["step_goal"])
+        st.plotly_chart(fig_steps, use_container_width=True,
+            config={"displayModeBar": False, "scrollZoom": False})
+
+        st.markdown("**😴 每日睡眠**")
+        fig_sleep = sleep_bar(history)
+        st.plotly_chart(fig_sleep, use_container_width=True,
+            config={"displayModeBar": False, "scrollZoom": False})
+    else:
+        st.info("暂无历史健康数据")
+
+
+@st.fragment
+def _render_travel_panel():
+    """旅行计划（fragment：勾选必带清单只重跑本面板）"""
+    _fragment_prelude()
+    st.markdown("#### 🗺️ 旅行计划")
+    travel = get_travel_plan()
+
+    if travel is None:
+        st.info("暂无旅行计划，可以通过 AI 对话创建新的旅行计划。")
+    else:
+        companions = travel.get("companions", [])
+        if isinstance(companions, str):
+            companions_str = companions
         else:
-            companions = travel.get("companions", [])
-            if isinstance(companions, str):
-                companions_str = companions
-            else:
-                companions_str = "、".join(companions) if companions else "独自出行"
-            st.markdown(
-                "**" + travel["trip_name"] + "**  \n"
-                "📆 " + travel["date"] + " | 👥 " + companions_str
+            companions_str = "、".join(companions) if companions else "独自出行"
+        st.markdown(
+            "**" + travel["trip_name"] + "**  \n"
+            "📆 " + travel["date"] + " | 👥 " + companions_str
+        )
+
+        t_m1, t_m2 = st.columns(2)
+        with t_m1:
+            st.metric("预算", "¥" + str(int(travel["budget"])))
+        with t_m2:
+            st.metric(
+                "预估花费",
+                "¥" + str(int(travel["total_estimated_cost"])),
+                delta="剩余 ¥" + str(int(travel["budget"] - travel["total_estimated_cost"])),
             )
 
-            t_m1, t_m2 = st.columns(2)
-            with t_m1:
-                st.metric("预算", "¥" + str(int(travel["budget"])))
-            with t_m2:
-                st.metric(
-                    "预估花费",
-                    "¥" + str(int(travel["total_estimated_cost"])),
-                    delta="剩余 ¥" + str(int(travel["budget"] - travel["total_estimated_cost"])),
+        st.markdown("**📍 行程时间线**")
+        if travel["itinerary"]:
+            st.markdown(_travel_timeline_html(travel["itinerary"]), unsafe_allow_html=True)
+        else:
+            st.caption("暂无行程，可通过 AI 对话添加行程站点")
+
+        packing_list = travel.get("packing_list", [])
+        if packing_list:
+            st.markdown("**🎒 必带清单**")
+            packing_checked = get_packing_checked()
+            for item in packing_list:
+                st.checkbox(
+                    item, value=item in packing_checked, key="pack_" + item,
+                    on_change=_on_toggle_packing, args=(item,),
                 )
 
-            st.markdown("**📍 行程时间线**")
-            if travel["itinerary"]:
-                for stop in travel["itinerary"]:
-                    cost_str = "¥" + str(int(stop["cost"])) if stop["cost"] > 0 else "免费"
-                    html = _travel_item_html(
-                        stop.get("icon", "📍"), stop["time"], stop["activity"],
-                        stop["location"], cost_str,
-                    )
-                    st.markdown(html, unsafe_allow_html=True)
-            else:
-                st.caption("暂无行程，可通过 AI 对话添加行程站点")
-
-            packing_list = travel.get("packing_list", [])
-            if packing_list:
-                st.markdown("**🎒 必带清单**")
-                packing_checked = get_packing_checked()
-                for item in packing_list:
-                    pack_key = "pack_" + item
-                    is_checked = item in packing_checked
-                    checked = st.checkbox(item, value=is_checked, key=pack_key)
-                    # 只在用户主动交互（值变化）时持久化
-                    if checked and not is_checked:
-                        update_packing(item, True)
-                        _toast_and_rerun("🎒 已保存", "💾")
-                    elif not checked and is_checked:
-                        update_packing(item, False)
-                        _toast_and_rerun("🎒 已取消", "💾")
+
+def _on_toggle_packing(item: str):
+    checked = st.session_state["pack_" + item]
+    update_packing(item, checked)
+    _queue_toast("🎒 已保存" if checked else "🎒 已取消", "💾")
 
 
 # ========== 主入口 ==========
-def main():
-    # 显示上次 rerun 前暂存的 toast 消息
-    if "_pending_toast" in st.session_state:
-        msg, icon = st.session_state._pending_toast
-        st.toast(msg, icon=icon)
-        del st.session_state._pending_toast
+_DASHBOARD_VIEW = "📊 数据看板"
+_VIEWS = {
+    "💬 AI 对话": render_chat_tab,
+    _DASHBOARD_VIEW: render_dashboard_tab,
+}
+_DEFAULT_VIEW = "💬 AI 对话"
+
 
-    render_sidebar()
-    render_header()
-    render_alerts()
+def _on_switch_view():
+    # 再次点击已选中的选项会取消选择，此时恢复为上一个视图
+    if st.session_state.active_view is None:
+        st.session_state.active_view = st.session_state.get("_last_view", _DEFAULT_VIEW)
+    st.session_state._last_view = st.session_state.active_view
 
-    tab_chat, tab_dashboard = st.tabs(["💬 AI 对话", "📊 数据看板"])
-    with tab_chat:
-        render_chat_tab()
-    with tab_dashboard:
-        render_dashboard_tab()
+
+def main():
+    st.session_state.setdefault("active_view", _DEFAULT_VIEW)
+    # 整页运行标记：fragment 据此区分自己是整页的一部分还是单独重跑
+    st.session_state._full_run_active = True
+    st.session_state.pop("_full_rerun_pending", None)  # 整页运行会重新渲染提醒卡片与看板面板
+    try:
+        # 显示回调暂存的 toast 消息
+        _show_pending_toast()
+
+        render_sidebar()
+        render_header()
+        render_alerts()
+
+        # st.tabs 每次都会把所有标签页跑一遍；改为按 session_state 中的当前视图只渲染一个
+        view = st.segmented_control(
+            "视图",
+            list(_VIEWS),
+            key="active_view",
+            on_change=_on_switch_view,
+            label_visibility="collapsed",
+        )
+        _VIEWS[view or _DEFAULT_VIEW]()
+    finally:
+        st.session_state._full_run_active = False
 
 
 if __name__ == "__main__":
@@ -17,3 +17,49 @@ DEEPSEEK_MODEL = "deepseek-chat"  # DeepSeek-V3
 # 应用配置
 APP_NAME = "UniLife OS"
 APP_ICON = "🎓"
+# 调试：在侧边栏底部显示运行指标（缓存命中率、排队与合并计数等），面向开发者，默认关闭
+DEBUG_METRICS = os.getenv("UNILIFE_DEBUG_METRICS", "0") == "1"
+
+# LLM 调用准入控制（进程内所有会话共享，防止突发请求触发 DeepSeek 限流）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))          # 同时在途请求上限
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))  # 每分钟请求数
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "120000"))  # 每分钟 token 数（预估）
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))            # 排队超时（秒）
+
+# 模型分级路由：简单查询 / 记录走 fast 档（输出更短、只带常用工具、只有一轮工具调用，
+# 之后一次无工具调用生成回答），分析规划类对话走 full 档。tools 为 None 表示携带全部工具。
+DEEPSEEK_FAST_MODEL = os.getenv("DEEPSEEK_FAST_MODEL", DEEPSEEK_MODEL)
+MODEL_TIERS = {
+    "fast": {
+        "model": DEEPSEEK_FAST_MODEL,
+        "max_tokens": 512,
+        "temperature": 0.5,
+        "max_tool_rounds": 1,
+        "tools": (
+            "query_overview", "query_schedule", "check_time_slot", "find_free_slots",
+            "query_finance", "query_health", "query_todos", "query_exams", "query_travel",
+            "record_expense", "record_water", "record_exercise", "record_mood",
+            "record_steps", "record_sleep", "toggle_todo", "add_todo", "update_packing",
+        ),
+    },
+    "full": {
+        "model": DEEPSEEK_MODEL,
+        "max_tokens": 1024,
+        "temperature": 0.7,
+        "max_tool_rounds": 5,
+        "tools": None,
+    },
+}
+FAST_TIER_MAX_CHARS = 40  # 超过该长度的用户消息一律走 full 档
+
+# 持久化落盘策略：
+#   none  — 只做临时文件 + 原子改名，不 fsync（最快，断电可能丢最近的写入）
+#   fsync — 每次提交都 fsync 文件与目录（最稳，最慢）
+#   group — 组提交：每 PERSIST_GROUP_COMMIT_MS 毫秒把各会话的写入攒成一批统一 fsync
+# 注意：修改先进入写后缓冲（见 PERSIST_FLUSH_DELAY_MS），以上策略只作用于后台刷盘那一刻；
+# 写操作返回时数据可能还在内存里，fsync/group 也不保证此刻已落盘（进程退出时会再刷一次）。
+PERSIST_DURABILITY = os.getenv("PERSIST_DURABILITY", "none")
+PERSIST_GROUP_COMMIT_MS = float(os.getenv("PERSIST_GROUP_COMMIT_MS", "10"))
+PERSIST_FLUSH_DELAY_MS = float(os.getenv("PERSIST_FLUSH_DELAY_MS", "200"))  # 写后缓冲：修改后多久批量落盘
+PERSIST_JSON_BACKEND = os.getenv("PERSIST_JSON_BACKEND", "")  # 留空自动选择：orjson → msgspec → json
+PERSIST_PRETTY_JSON = os.getenv("PERSIST_PRETTY_JSON", "").lower() in ("1", "true", "yes")  # 数据文件缩进输出
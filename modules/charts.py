@@ -0,0 +1,180 @@
+"""
+UniLife OS — 数据看板图表构建
+图表按输入数据的内容哈希缓存（进程级，跨会话共享），数据未变化时直接复用已构建的 Figure，
+避免每次 rerun 都重新构造 DataFrame 与 plotly 图表。
+pandas / plotly 在首次构建图表时才导入，不打开数据看板就不付这部分启动开销。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MAX_CACHED_FIGURES = 32  # LRU 上限：每种图表保留最近若干个数据版本
+
+
+class _FigureCache:
+    """按 (图表类型, 数据哈希) 缓存 Figure 的 LRU，记录命中率与构建耗时。"""
+
+    def __init__(self, max_entries: int):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], object] = OrderedDict()
+        self._max_entries = max_entries
+        self._hits = 0
+        self._misses = 0
+        self._build_seconds = 0.0
+
+    def get_or_build(self, kind: str, inputs, builder):
+        key = (kind, _data_version(inputs))
+        with self._lock:
+            fig = self._entries.get(key)
+            if fig is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return fig
+
+        started = time.perf_counter()
+        fig = builder()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._misses += 1
+            self._build_seconds += elapsed
+            self._entries[key] = fig
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return fig
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+                "total_build_ms": self._build_seconds * 1000,
+                "avg_build_ms": self._build_seconds * 1000 / self._misses if self._misses else 0.0,
+            }
+
+
+_cache = _FigureCache(MAX_CACHED_FIGURES)
+
+
+def _data_version(inputs) -> str:
+    """图表输入数据的内容哈希。"""
+    raw = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_chart_cache_stats() -> dict:
+    """图表缓存命中率与构建耗时。"""
+    return _cache.stats()
+
+
+# ========== 各图表构建 ==========
+
+def finance_pie(categories: dict):
+    """消费构成环形图。"""
+    def build():
+        import pandas as pd
+        import plotly.express as px
+
+        cat_data = pd.DataFrame(
+            list(categories.items()),
+            columns=["类别", "金额"],
+        )
+        fig = px.pie(
+            cat_data,
+            values="金额",
+            names="类别",
+            color_discrete_sequence=px.colors.qualitative.Set2,
+            hole=0.4,
+        )
+        fig.update_traces(
+            textposition="inside",
+            textinfo="percent+label",
+            hovertemplate="<b>%{label}</b><br>金额: ¥%{value:.0f}<br>占比: %{percent}<extra></extra>",
+        )
+        fig.update_layout(
+            showlegend=True,
+            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
+            margin=dict(t=20, b=20, l=20, r=20),
+            height=350,
+            dragmode=False,
+        )
+        return fig
+
+    return _cache.get_or_build("finance_pie", categories, build)
+
+
+def _health_frame(history: list[dict]):
+    import pandas as pd
+
+    df_health = pd.DataFrame(history)
+    df_health["date"] = pd.to_datetime(df_health["date"])
+    return df_health.sort_values("date")
+
+
+def steps_line(history: list[dict], step_goal: int):
+    """每日步数折线图（含目标线）。"""
+    def build():
+        import plotly.express as px
+
+        fig = px.line(
+            _health_frame(history),
+            x="date",
+            y="steps",
+            markers=True,
+            labels={"date": "日期", "steps": "步数"},
+        )
+        fig.add_hline(
+            y=step_goal,
+            line_dash="dash",
+            line_color="red",
+            annotation_text="目标 " + "{:,}".format(step_goal),
+        )
+        fig.update_layout(
+            margin=dict(t=20, b=20, l=20, r=20),
+            height=250,
+            showlegend=False,
+            dragmode=False,
+        )
+        return fig
+
+    # 只按本图用到的字段计算版本：记睡眠、喝水不会让步数图失效
+    inputs = [[h["date"], h["steps"]] for h in history] + [step_goal]
+    return _cache.get_or_build("steps_line", inputs, build)
+
+
+def sleep_bar(history: list[dict]):
+    """每日睡眠柱状图（含 7h 建议线）。"""
+    def build():
+        import plotly.express as px
+
+        fig = px.bar(
+            _health_frame(history),
+            x="date",
+            y="sleep",
+            labels={"date": "日期", "sleep": "睡眠(小时)"},
+            color="sleep",
+            color_continuous_scale=["#ff6b6b", "#ffa502", "#7bed9f"],
+        )
+        fig.add_hline(
+            y=7,
+            line_dash="dash",
+            line_color="green",
+            annotation_text="建议 7h",
+        )
+        fig.update_layout(
+            margin=dict(t=20, b=20, l=20, r=20),
+            height=250,
+            showlegend=False,
+            coloraxis_showscale=False,
+            dragmode=False,
+        )
+        return fig
+
+    inputs = [[h["date"], h["sleep"]] for h in history]
+    return _cache.get_or_build("sleep_bar", inputs, build)
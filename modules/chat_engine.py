@@ -4,11 +4,21 @@ UniLife OS — DeepSeek 对话引擎（Agent 增强版）
 """
 from __future__ import annotations
 
+import hashlib
 import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
 from openai import OpenAI
-from config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL
+from modules.singleflight import SingleFlight
+from config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL,
+    MODEL_TIERS, FAST_TIER_MAX_CHARS,
+    LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_QUEUE_TIMEOUT,
+)
 
-MAX_TOOL_ROUNDS = 5  # 防止无限循环
+MAX_TOOL_ROUNDS = 5  # 防止无限循环（各档 max_tool_rounds 的硬上限）
 MAX_CONTEXT_MESSAGES = 20  # 非 system 消息上限，防止超出上下文窗口
 
 # 模块级单例客户端，避免每次调用都创建新连接
@@ -38,40 +48,336 @@ def get_client() -> OpenAI:
     return _client
 
 
-def _call_with_tools(messages: list[dict], tools: list[dict]) -> object:
-    """单次非流式 API 调用（带 tools 参数）。"""
-    client = get_client()
-    return client.chat.completions.create(
-        model=DEEPSEEK_MODEL,
-        messages=messages,
-        tools=tools,
-        temperature=0.7,
-        max_tokens=1024,
-    )
+# ========== 准入控制：令牌桶 + 并发上限 + 按用户公平排队 ==========
 
+class QueueTimeoutError(RuntimeError):
+    """排队等待超过 LLM_QUEUE_TIMEOUT 仍未获准调用。"""
 
-def chat_agent(messages: list[dict], tools: list[dict], execute_tool_fn) -> tuple[str, list[dict]]:
+
+class _TokenBucket:
+    """令牌桶：容量为一分钟的配额，按秒匀速补充。"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 1))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离桶内攒够 amount 个令牌还需等待的秒数（超过容量的请求按满桶计）。"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class _Ticket:
+    __slots__ = ("user_id", "tokens", "enqueued_at", "granted", "charged")
+
+    def __init__(self, user_id: str, tokens: int):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.charged = 0  # 放行时实际从 token 桶扣除的数量（超大请求按桶容量封顶）
+
+
+class AdmissionScheduler:
+    """
+    进程级 LLM 调用调度器。
+    - 请求数 / token 数两个令牌桶，吞吐贴近服务商限额而不触发 429
+    - 在途请求数上限
+    - 每个用户一个队列，按用户轮转放行队首请求，单个用户的突发不会饿死其他人
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self._cond = threading.Condition()
+        self._max_concurrency = max(max_concurrency, 1)
+        self._request_bucket = _TokenBucket(requests_per_minute)
+        self._token_bucket = _TokenBucket(tokens_per_minute)
+        self._queues: OrderedDict[str, deque] = OrderedDict()  # 迭代顺序即轮转顺序
+        self._in_flight = 0
+        self._stats = {"admitted": 0, "timed_out": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def acquire(self, user_id: str, est_tokens: int, timeout: float | None = None) -> _Ticket:
+        """排队直到获准调用，返回放行的票据（结束时交给 release）；超时抛 QueueTimeoutError。"""
+        ticket = _Ticket(user_id, est_tokens)
+        deadline = None if timeout is None else ticket.enqueued_at + timeout
+        with self._cond:
+            self._queues.setdefault(user_id, deque()).append(ticket)
+            while True:
+                delay = self._dispatch()
+                if ticket.granted:
+                    break
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    self._drop(ticket)
+                    self._stats["timed_out"] += 1
+                    raise QueueTimeoutError(f"排队等待超过 {timeout:g} 秒")
+                wait_for = delay
+                if deadline is not None:
+                    wait_for = deadline - now if wait_for is None else min(wait_for, deadline - now)
+                self._cond.wait(wait_for)
+            waited = time.monotonic() - ticket.enqueued_at
+            self._stats["admitted"] += 1
+            self._stats["total_wait"] += waited
+            self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+        return ticket
+
+    def release(self, ticket: _Ticket, used_tokens: int | None = None):
+        """请求结束：归还并发名额，并按实际用量修正 token 桶（退还 / 补扣的是放行时实际扣除的数量与用量之差）。"""
+        with self._cond:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                bucket = self._token_bucket
+                bucket.tokens = min(bucket.capacity, bucket.tokens + ticket.charged - used_tokens)
+            self._dispatch()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """排队指标快照：放行数、超时数、平均 / 最大排队时长、当前排队数与在途数。"""
+        with self._cond:
+            admitted = self._stats["admitted"]
+            return {
+                "admitted": admitted,
+                "timed_out": self._stats["timed_out"],
+                "avg_wait": self._stats["total_wait"] / admitted if admitted else 0.0,
+                "max_wait": self._stats["max_wait"],
+                "queued": sum(len(q) for q in self._queues.values()),
+                "in_flight": self._in_flight,
+            }
+
+    def _dispatch(self) -> float | None:
+        """
+        按用户轮转放行队首请求（调用方需持有锁）。
+        返回令牌不足时需要等待的秒数；因并发已满或队列为空而停止时返回 None。
+        """
+        now = time.monotonic()
+        self._request_bucket.refill(now)
+        self._token_bucket.refill(now)
+        granted_any = False
+        delay = None
+        while self._queues and self._in_flight < self._max_concurrency:
+            user_id, queue = next(iter(self._queues.items()))
+            ticket = queue[0]
+            wait = max(self._request_bucket.wait_time(1), self._token_bucket.wait_time(ticket.tokens))
+            if wait > 0:
+                delay = wait
+                break
+            self._request_bucket.tokens -= 1
+            ticket.charged = min(ticket.tokens, self._token_bucket.capacity)
+            self._token_bucket.tokens -= ticket.charged
+            queue.popleft()
+            ticket.granted = True
+            self._in_flight += 1
+            granted_any = True
+            # 轮转：该用户移到队尾，队列空则移除
+            del self._queues[user_id]
+            if queue:
+                self._queues[user_id] = queue
+        if granted_any:
+            self._cond.notify_all()
+        return delay
+
+    def _drop(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user_id]
+
+
+_scheduler = AdmissionScheduler(LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+
+
+def get_scheduler_stats() -> dict:
+    """获取 LLM 调用排队指标。"""
+    return _scheduler.stats()
+
+
+def _estimate_tokens(messages: list[dict], tools: list[dict] | None, max_tokens: int) -> int:
+    """粗略预估一次调用的 token 数（输入按约 2 字符 / token，加上输出上限）。"""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    if tools:
+        chars += len(json.dumps(tools, ensure_ascii=False))
+    return chars // 2 + max_tokens
+
+
+def _create_completion(user_id: str, **kwargs) -> object:
+    """经过准入控制的 chat.completions.create 调用。"""
+    est = _estimate_tokens(kwargs["messages"], kwargs.get("tools"), kwargs.get("max_tokens", 1024))
+    ticket = _scheduler.acquire(user_id, est, timeout=LLM_QUEUE_TIMEOUT)
+    used = None
+    try:
+        response = get_client().chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        return response
+    finally:
+        _scheduler.release(ticket, used)
+
+
+# 相同请求（双击提交、多次 rerun）共享同一次在途 API 调用
+_llm_flight = SingleFlight()
+
+
+def get_llm_coalesce_stats() -> dict:
+    """获取 LLM 请求合并计数。"""
+    return _llm_flight.stats()
+
+
+def _request_hash(**kwargs) -> str:
+    """请求参数的稳定哈希，作为 singleflight 的 key。"""
+    raw = json.dumps(kwargs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_idempotency_key(session_id: str, turn: int, tool_call_id: str) -> str:
+    """
+    由 (会话, 轮次, tool_call_id) 派生写工具的幂等键。
+    拦截的是同一轮内同一个 tool_call 的重复执行（如合并的相同 LLM 请求返回同一组 tool_calls 后各自执行）；
+    重新调用 LLM 得到的是新的 tool_call_id，用户重发请求不会被当作重复。
+    """
+    raw = f"{session_id}:{turn}:{tool_call_id}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ========== 模型分级路由 ==========
+
+# 出现这些词说明需要分析 / 规划，走 full 档
+_FULL_TIER_KEYWORDS = (
+    "分析", "规划", "计划", "建议", "安排", "总结", "对比", "比较", "为什么", "怎么办",
+    "如何", "优化", "推荐", "复习", "行程", "旅行", "目标",
+)
+
+# 修改意图（可能要用到 fast 档没有的预算、课程、行程站点、旅行计划等修改类工具）也走 full 档。
+# 按完整的动词短语匹配，避免单字误伤（「参加」「设计」「空调」不算修改）
+_EDIT_INTENT = re.compile(
+    r"(移|挪|调|改|换|推迟|提前)到|(改|设|调)(成|为)|修改|改(名|一下)|换(个|一个)?(教室|地点|时间|老师)"
+    r"|设置|预算\s*(是|为|改|设|调|定)?\s*\d"
+    r"|(加|添|新增)(一|个)?(门|节)?课|有(个|一门|一节)(选修|必修|实验)?课"
+    r"|(加|添|新增)(一|个)?(站|景点)|删|去掉|不上了|退课|取消|不去|创建|新建"
+)
+
+_tier_stats_lock = threading.Lock()
+_tier_stats = {
+    tier: {"turns": 0, "latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+    for tier in MODEL_TIERS
+}
+
+
+def classify_turn(text: str) -> str:
+    """把一轮用户输入分到 "fast"（简单查询 / 记录）或 "full"（分析规划、结构性修改）。"""
+    text = (text or "").strip()
+    if not text or len(text) > FAST_TIER_MAX_CHARS:
+        return "full"
+    if any(k in text for k in _FULL_TIER_KEYWORDS) or _EDIT_INTENT.search(text):
+        return "full"
+    return "fast"
+
+
+def get_tier_stats() -> dict:
+    """各档位的轮次数、平均延迟（秒）与平均 token 用量。"""
+    with _tier_stats_lock:
+        result = {}
+        for tier, entry in _tier_stats.items():
+            turns = entry["turns"]
+            result[tier] = {
+                **entry,
+                "avg_latency": entry["latency"] / turns if turns else 0.0,
+                "avg_tokens": (entry["prompt_tokens"] + entry["completion_tokens"]) / turns if turns else 0.0,
+            }
+        return result
+
+
+def _record_tier_usage(tier: str, latency: float, usage: dict):
+    with _tier_stats_lock:
+        entry = _tier_stats[tier]
+        entry["turns"] += 1
+        entry["latency"] += latency
+        entry["prompt_tokens"] += usage["prompt_tokens"]
+        entry["completion_tokens"] += usage["completion_tokens"]
+
+
+def _accumulate_usage(usage: dict, response) -> None:
+    resp_usage = getattr(response, "usage", None)
+    if resp_usage is not None:
+        usage["prompt_tokens"] += getattr(resp_usage, "prompt_tokens", 0) or 0
+        usage["completion_tokens"] += getattr(resp_usage, "completion_tokens", 0) or 0
+
+
+def _last_user_text(messages: list[dict]) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+
+def _call_with_tools(messages: list[dict], tools: list[dict], user_id: str = "default",
+                     tier_config: dict | None = None) -> object:
+    """单次非流式 API 调用（带 tools 参数），相同请求合并后经过全局准入控制。"""
+    cfg = tier_config or MODEL_TIERS["full"]
+    params = {
+        "model": cfg["model"],
+        "messages": messages,
+        "tools": tools,
+        "temperature": cfg["temperature"],
+        "max_tokens": cfg["max_tokens"],
+    }
+    return _llm_flight.do(_request_hash(**params), lambda: _create_completion(user_id, **params))
+
+
+def chat_agent(messages: list[dict], tools: list[dict], execute_tool_fn,
+               session_id: str | None = None, turn: int | None = None,
+               tier: str | None = None) -> tuple[str, list[dict]]:
     """
     Agent 循环：自动调用工具并将结果反馈给模型，直到得到最终文本回复。
 
     参数:
         messages: 完整消息列表（含 system prompt）
         tools: 工具 schema 列表
-        execute_tool_fn: 工具执行函数 (name, args) -> str
+        execute_tool_fn: 工具执行函数 (name, args[, idempotency_key=...]) -> str
+        session_id / turn: 会话 ID 与对话轮次，同时提供时为每次工具调用附带幂等键；
+            session_id 同时作为准入控制的公平排队单位
+        tier: 模型档位 "fast" / "full"，不传则按最后一条用户消息自动分类
 
     返回:
         (final_text, tool_call_log)
         - final_text: 最终回复文本
         - tool_call_log: 工具调用记录列表 [{"name": ..., "args": ..., "result": ...}, ...]
     """
+    tier = tier or classify_turn(_last_user_text(messages))
+    cfg = MODEL_TIERS[tier]
+    if cfg["tools"] is not None:
+        tools = [t for t in tools if t["function"]["name"] in cfg["tools"]]
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    started = time.perf_counter()
+    try:
+        return _run_agent_loop(messages, tools, execute_tool_fn, session_id, turn, cfg, usage)
+    finally:
+        _record_tier_usage(tier, time.perf_counter() - started, usage)
+
+
+def _run_agent_loop(messages: list[dict], tools: list[dict], execute_tool_fn,
+                    session_id: str | None, turn: int | None,
+                    cfg: dict, usage: dict) -> tuple[str, list[dict]]:
+    """chat_agent 的主循环，按档位配置调用模型并累计 token 用量。"""
     working_messages = list(trim_messages(messages))
     tool_call_log = []
+    user_id = session_id or "default"
 
-    for _round in range(MAX_TOOL_ROUNDS):
+    for _round in range(min(cfg["max_tool_rounds"], MAX_TOOL_ROUNDS)):
         try:
-            response = _call_with_tools(working_messages, tools)
+            response = _call_with_tools(working_messages, tools, user_id, cfg)
+        except QueueTimeoutError:
+            return "⚠️ 当前使用的同学有点多，排队超时了，请稍后再试~", tool_call_log
         except Exception as e:
             return f"⚠️ 连接出了点问题：{str(e)}\n请检查 API Key 是否正确配置。", tool_call_log
+        _accumulate_usage(usage, response)
 
         choice = response.choices[0]
         assistant_msg = choice.message
@@ -110,7 +416,11 @@ def chat_agent(messages: list[dict], tools: list[dict], execute_tool_fn) -> tupl
             except json.JSONDecodeError:
                 func_args = {}
 
-            result = execute_tool_fn(func_name, func_args)
+            if session_id is not None and turn is not None:
+                key = make_idempotency_key(session_id, turn, tc.id)
+                result = execute_tool_fn(func_name, func_args, idempotency_key=key)
+            else:
+                result = execute_tool_fn(func_name, func_args)
 
             tool_call_log.append({
                 "name": func_name,
@@ -125,14 +435,16 @@ def chat_agent(messages: list[dict], tools: list[dict], execute_tool_fn) -> tupl
                 "content": result,
             })
 
-    # 超过最大轮次，做最后一次无工具调用获取总结
+    # 超过最大轮次，做最后一次无工具调用获取总结（同样受本档 max_tokens 限制）
     try:
-        final_response = get_client().chat.completions.create(
-            model=DEEPSEEK_MODEL,
+        final_response = _create_completion(
+            user_id,
+            model=cfg["model"],
             messages=working_messages,
-            temperature=0.7,
-            max_tokens=1024,
+            temperature=cfg["temperature"],
+            max_tokens=cfg["max_tokens"],
         )
+        _accumulate_usage(usage, final_response)
         return final_response.choices[0].message.content or "", tool_call_log
     except Exception as e:
         return f"⚠️ 连接出了点问题：{str(e)}", tool_call_log
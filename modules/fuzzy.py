@@ -0,0 +1,178 @@
+"""
+UniLife OS — 名称模糊检索（字符 n-gram 倒排索引）
+课程名、教师、地点、行程活动等短文本按单字 + 相邻双字建倒排索引，查询时只对命中候选打分：
+按 IDF 加权的 n-gram 覆盖率为主，子串、按序出现（缩写，如「高数」→「高等数学 II」）额外加分，多字段取最高分。
+索引按 key 增量同步：只有新增、内容变化、被删除的记录才更新倒排表。
+"""
+from __future__ import annotations
+
+import math
+import re
+import threading
+from typing import Hashable, Iterable, Sequence
+
+_NOISE = re.compile(r"[\s\-_·•,，.。:：;；/\\()（）\[\]【】「」《》\"'“”‘’!！?？]+")
+
+MIN_SCORE = 0.5      # 低于该分数视为不匹配
+TIE_MARGIN = 0.15    # 与最高分相差在该范围内的候选视为同样可能，需要向用户确认
+CONFIDENT_SCORE = 1.0  # 破坏性操作：最高分须达到该分数（名称基本包含查询），才可不经确认直接采用
+CONFIDENT_GAP = 0.5    # 同时须领先次高分（含低于门槛的相近名称）这么多
+
+
+def normalize(text: str) -> str:
+    """统一大小写并去掉空白与标点，「Python 程序设计」与「python程序设计」视为相同。"""
+    return _NOISE.sub("", str(text).lower())
+
+
+def _grams(text: str) -> set[str]:
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _is_subsequence(query: str, text: str) -> bool:
+    it = iter(text)
+    return all(ch in it for ch in query)
+
+
+class NgramIndex:
+    """
+    多字段 n-gram 倒排索引。
+    weights 为各字段的权重（按 sync 传入的字段顺序），主名称字段通常为 1，辅助字段（教师、地点）较低。
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        self._weights = tuple(weights)
+        self._lock = threading.RLock()
+        self._docs: dict[Hashable, tuple[str, ...]] = {}            # key → 归一化后的各字段
+        self._doc_grams: dict[Hashable, tuple[set[str], ...]] = {}
+        self._postings: tuple[dict[str, set[Hashable]], ...] = tuple({} for _ in self._weights)  # 每个字段：gram → key
+        self._df: dict[str, int] = {}                               # gram → 含该 gram 的记录数
+        self._source: object = None
+
+    # ---------- 维护 ----------
+
+    def sync(self, records: Iterable[tuple[Hashable, Sequence[str]]], source: object = None):
+        """
+        按 (key, 字段文本) 同步索引：内容未变的 key 不动，只增删改有差异的记录。
+        source 为数据来源对象（如课表 tuple）：与上次同步的是同一个对象时直接跳过，连比较都不做。
+        """
+        with self._lock:
+            if source is not None and source is self._source:
+                return
+            self._source = source
+            seen = set()
+            for key, fields in records:
+                seen.add(key)
+                self._put(key, tuple(normalize(f or "") for f in fields))
+            for key in [k for k in self._docs if k not in seen]:
+                self._remove(key)
+
+    def _put(self, key: Hashable, fields: tuple[str, ...]):
+        if self._docs.get(key) == fields:
+            return
+        self._remove(key)
+        grams = tuple(_grams(f) for f in fields)
+        self._docs[key] = fields
+        self._doc_grams[key] = grams
+        for postings, field_grams in zip(self._postings, grams):
+            for g in field_grams:
+                postings.setdefault(g, set()).add(key)
+        for g in set().union(*grams):
+            self._df[g] = self._df.get(g, 0) + 1
+
+    def _remove(self, key: Hashable):
+        grams = self._doc_grams.pop(key, None)
+        if grams is None:
+            return
+        del self._docs[key]
+        for postings, field_grams in zip(self._postings, grams):
+            for g in field_grams:
+                keys = postings[g]
+                keys.discard(key)
+                if not keys:
+                    del postings[g]
+        for g in set().union(*grams):
+            self._df[g] -= 1
+            if not self._df[g]:
+                del self._df[g]
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, limit: int = 5, fields: Sequence[int] | None = None,
+               min_score: float = MIN_SCORE) -> list[tuple[Hashable, float]]:
+        """
+        按得分从高到低返回 [(key, score)]，只包含得分不低于 min_score 的记录。
+        fields 限定参与打分的字段序号（如只看主名称字段），默认全部字段。
+        """
+        q = normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            q_grams = _grams(q)
+            # 语料中不存在的 gram 按最稀有计入分母：随手乱打的查询不会因为碰巧共有一两个字而命中
+            idf = {g: math.log(1 + n_docs / self._df.get(g, 1)) for g in q_grams}
+            total = sum(idf.values()) or 1.0
+
+            # 逐 gram 累加覆盖率（只触及含查询 gram 的记录），再对候选计算子串 / 缩写加分
+            best: dict[Hashable, float] = {}
+            for field, (postings, weight) in enumerate(zip(self._postings, self._weights)):
+                if fields is not None and field not in fields:
+                    continue
+                coverage: dict[Hashable, float] = {}
+                for g in q_grams:
+                    w = idf[g] / total
+                    for key in postings.get(g, ()):
+                        coverage[key] = coverage.get(key, 0.0) + w
+                for key, score in coverage.items():
+                    # 加分最多 0.5，加上也够不到门槛、又不可能完全相同的候选直接跳过
+                    if (score + 0.5) * weight < min_score:
+                        continue
+                    text = self._docs[key][field]
+                    if text == q:
+                        score = 2.0
+                    elif q in text:
+                        score += 0.5
+                    elif _is_subsequence(q, text):
+                        score += 0.25
+                    score *= weight
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            results = [(key, score) for key, score in best.items() if score >= min_score]
+        results.sort(key=lambda r: r[1], reverse=True)
+        return results[:limit]
+
+    def best_matches(self, query: str) -> list[Hashable]:
+        """得分最高的一档候选：唯一一个即可直接采用，多个则需要用户确认。"""
+        results = self.search(query)
+        if not results:
+            return []
+        top = results[0][1]
+        return [key for key, score in results if score >= top - TIE_MARGIN]
+
+    def confident_matches(self, query: str) -> tuple[list[Hashable], bool]:
+        """
+        供删除 / 修改等破坏性操作使用：只按主名称字段（第 0 个字段）打分，不看教师、地点。
+        返回 (候选, 是否可直接采用)：最高分达到 CONFIDENT_SCORE 且领先次高分 CONFIDENT_GAP 以上时为唯一候选且可直接采用；
+        否则为得分接近最高分的候选（可能只有一个，也可能为空），需要用户确认。
+        """
+        results = self.search(query, fields=(0,), min_score=MIN_SCORE / 2)
+        if not results or results[0][1] < MIN_SCORE:
+            return [], False
+        top = results[0][1]
+        runner_up = results[1][1] if len(results) > 1 else 0.0
+        if top >= CONFIDENT_SCORE and top - runner_up >= CONFIDENT_GAP:
+            return [results[0][0]], True
+        return [key for key, score in results if score >= top - CONFIDENT_GAP], False
+
+    def match(self, query: str, records: Iterable[tuple[Hashable, Sequence[str]]], source: object = None) -> list[Hashable]:
+        """sync 后立即 best_matches，两步在同一把锁内完成：并发会话各自的数据版本不会互相串。"""
+        with self._lock:
+            self.sync(records, source)
+            return self.best_matches(query)
+
+    def match_confident(self, query: str, records: Iterable[tuple[Hashable, Sequence[str]]],
+                        source: object = None) -> tuple[list[Hashable], bool]:
+        """sync 后立即 confident_matches（同在一把锁内）。"""
+        with self._lock:
+            self.sync(records, source)
+            return self.confident_matches(query)
@@ -9,8 +9,11 @@ UniLife OS — Mock 数据中心 (Day 2 增强版 + 持久化集成)
 """
 from __future__ import annotations
 
+import html
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from types import MappingProxyType
 from calendar import monthrange
 from modules.persistence import (
     get_todo_overrides, get_extra_transactions, get_health_overrides, get_extra_todos,
@@ -18,127 +21,177 @@ from modules.persistence import (
     get_budget, get_travel_overrides, get_extra_itinerary,
     get_deleted_itinerary_idxs, get_itinerary_updates,
     get_exercise_weekly, get_exercise_goal, set_exercise_goal,
+    section_version,
 )
+from modules.overlay import Overlay
+from modules.schedule_index import IntervalIndex, ScheduleIndex, parse_interval
+from modules.records import (
+    Course, Transaction, Todo, ItineraryStop,
+    Weekday, ExpenseCategory, TodoCategory, Priority,
+)
+
+# ========== 基础数据 ==========
+# 模块加载时只构造一次：记录不可变、容器为 tuple / MappingProxyType，所有调用共享同一份，
+# getter 合并持久化修改时只为被改动的记录生成新对象。
+
+_BASE_SCHEDULE = (
+    Course(1, Weekday.MON, "08:30-10:05", "高等数学 II",
+           "教学楼 A-301", "王教授", "必修"),
+    Course(2, Weekday.MON, "14:00-15:35", "大学物理",
+           "实验楼 B-205", "李教授", "必修"),
+    Course(3, Weekday.TUE, "10:15-11:50", "Python 程序设计",
+           "计算机楼 C-102", "张教授", "必修"),
+    Course(4, Weekday.TUE, "14:00-15:35", "体育（羽毛球）",
+           "体育馆 B区", "孙老师", "必修"),
+    Course(5, Weekday.WED, "08:30-10:05", "线性代数",
+           "教学楼 A-405", "陈教授", "必修"),
+    Course(6, Weekday.WED, "14:00-15:35", "英语听说",
+           "外语楼 D-201", "Emily", "必修"),
+    Course(7, Weekday.THU, "10:15-11:50", "数据结构",
+           "计算机楼 C-301", "刘教授", "必修"),
+    Course(8, Weekday.THU, "14:00-17:00", "物理实验",
+           "实验楼 B-101", "李教授", "实验"),
+    Course(9, Weekday.FRI, "08:30-10:05", "思想政治理论",
+           "教学楼 A-101", "赵教授", "必修"),
+    Course(10, Weekday.FRI, "14:00-15:35", "创新创业基础",
+           "教学楼 A-501", "周老师", "选修"),
+)
+
+_BASE_SPENT = 1650.00
+_BASE_CATEGORIES = MappingProxyType({
+    "餐饮": 820.00,
+    "交通": 150.00,
+    "购物": 380.00,
+    "学习用品": 120.00,
+    "娱乐": 100.00,
+    "其他": 80.00,
+})
+
+_BASE_TRANSACTIONS = (
+    Transaction("2026-02-20", "食堂早餐", 7.00, ExpenseCategory.FOOD, "🍜"),
+    Transaction("2026-02-19", "食堂午餐", 15.00, ExpenseCategory.FOOD, "🍜"),
+    Transaction("2026-02-19", "超市零食", 23.50, ExpenseCategory.SHOPPING, "🛒"),
+    Transaction("2026-02-18", "奶茶（一点点）", 18.00, ExpenseCategory.FOOD, "🧋"),
+    Transaction("2026-02-18", "地铁充值", 50.00, ExpenseCategory.TRANSPORT, "🚇"),
+    Transaction("2026-02-17", "教材《数据结构》", 45.00, ExpenseCategory.STUDY, "📚"),
+    Transaction("2026-02-17", "食堂晚餐", 18.00, ExpenseCategory.FOOD, "🍜"),
+    Transaction("2026-02-16", "电影票《流浪地球3》", 39.90, ExpenseCategory.ENTERTAINMENT, "🎬"),
+    Transaction("2026-02-16", "爆米花可乐", 28.00, ExpenseCategory.FOOD, "🍿"),
+    Transaction("2026-02-15", "外卖（麻辣烫）", 25.00, ExpenseCategory.FOOD, "🥡"),
+    Transaction("2026-02-14", "情人节礼物", 99.00, ExpenseCategory.SHOPPING, "🎁"),
+    Transaction("2026-02-13", "打印资料", 8.50, ExpenseCategory.STUDY, "🖨️"),
+    Transaction("2026-02-12", "食堂午餐", 14.00, ExpenseCategory.FOOD, "🍜"),
+    Transaction("2026-02-11", "公交月卡", 50.00, ExpenseCategory.TRANSPORT, "🚌"),
+    Transaction("2026-02-10", "水果（苹果+香蕉）", 15.80, ExpenseCategory.FOOD, "🍎"),
+    Transaction("2026-02-09", "理发", 35.00, ExpenseCategory.OTHER, "💇"),
+    Transaction("2026-02-08", "网易云音乐会员", 15.00, ExpenseCategory.ENTERTAINMENT, "🎵"),
+    Transaction("2026-02-07", "食堂晚餐", 16.00, ExpenseCategory.FOOD, "🍜"),
+    Transaction("2026-02-05", "淘宝（数据线）", 19.90, ExpenseCategory.SHOPPING, "🛒"),
+    Transaction("2026-02-03", "洗衣液+纸巾", 32.00, ExpenseCategory.OTHER, "🧴"),
+    Transaction("2026-02-01", "开学聚餐AA", 68.00, ExpenseCategory.FOOD, "🍻"),
+)
+
+# 过去 6 天的基础数据模板（从最近到最远）
+_PAST_HEALTH = tuple(MappingProxyType(d) for d in (
+    {"steps": 6210, "sleep": 7.0, "water": 6, "exercise": False, "mood": "🙂"},
+    {"steps": 3800, "sleep": 5.5, "water": 3, "exercise": False, "mood": "😫"},
+    {"steps": 7500, "sleep": 7.5, "water": 7, "exercise": False, "mood": "😊"},
+    {"steps": 5100, "sleep": 6.0, "water": 5, "exercise": False, "mood": "😐"},
+    {"steps": 10200, "sleep": 7.0, "water": 8, "exercise": True, "mood": "😄"},
+    {"steps": 8900, "sleep": 8.0, "water": 6, "exercise": False, "mood": "😊"},
+))
+
+_BASE_TODOS = (
+    Todo(1, "提交高数作业", "2026-02-20", Priority.URGENT, False, TodoCategory.STUDY),
+    Todo(2, "复习线性代数期中", "2026-02-26", Priority.IMPORTANT, False, TodoCategory.STUDY),
+    Todo(3, "Python 实验报告", "2026-02-22", Priority.IMPORTANT, False, TodoCategory.STUDY),
+    Todo(4, "归还图书馆的书", "2026-02-21", Priority.NORMAL, False, TodoCategory.LIFE),
+    Todo(5, "社团例会", "2026-02-20", Priority.NORMAL, True, TodoCategory.SOCIAL),
+    Todo(6, "给妈妈打电话", "2026-02-21", Priority.NORMAL, False, TodoCategory.LIFE),
+    Todo(7, "洗衣服", "2026-02-20", Priority.NORMAL, False, TodoCategory.LIFE),
+)
+
+_EXAMS = tuple(MappingProxyType(e) for e in (
+    {"course": "线性代数", "date": "2026-02-26",
+     "location": "教学楼 A-101", "type": "期中考试"},
+    {"course": "高等数学 II", "date": "2026-03-05",
+     "location": "教学楼 A-301", "type": "期中考试"},
+    {"course": "大学物理", "date": "2026-03-12",
+     "location": "实验楼 B-205", "type": "期中考试"},
+))
+
+_BASE_TRAVEL = MappingProxyType({
+    "trip_name": "周末深圳一日游 🏖️",
+    "date": "2026-03-01",
+    "budget": 300.00,
+    "status": "计划中",
+    "companions": ("室友小李", "同学小王"),
+    "packing_list": ("充电宝", "防晒霜", "学生证（门票优惠）", "水杯", "零食"),
+})
+
+_BASE_ITINERARY = (
+    ItineraryStop("08:00", "学校出发（地铁）", "大学城站", 8.00, "🚇"),
+    ItineraryStop("09:30", "到达世界之窗", "世界之窗", 0, "🏰"),
+    ItineraryStop("09:30-12:00", "游玩世界之窗", "世界之窗", 80.00, "🎢"),
+    ItineraryStop("12:00-13:00", "午餐（海岸城）", "海岸城购物中心", 60.00, "🍱"),
+    ItineraryStop("13:30-16:00", "深圳湾公园骑行", "深圳湾公园", 30.00, "🚴"),
+    ItineraryStop("16:30-18:00", "海岸城逛街", "海岸城购物中心", 50.00, "🛍️"),
+    ItineraryStop("18:00-19:00", "晚餐", "海岸城美食区", 55.00, "🍜"),
+    ItineraryStop("19:30", "返程（地铁）", "后海站", 8.00, "🚇"),
+)
+
+
+# 覆盖层：课程按 ID、待办按 ID、行程站点按在 mock 行程中的位置标识
+_schedule_overlay = Overlay(_BASE_SCHEDULE, lambda _, c: c.id)
+_todo_overlay = Overlay(_BASE_TODOS, lambda _, t: t.id)
+_itinerary_overlay = Overlay(_BASE_ITINERARY, lambda i, _: i)
+
+
+# ========== 数据获取 ==========
+
+@lru_cache(maxsize=512)
+def _parse_date(text: str) -> date:
+    """YYYY-MM-DD → date（截止日期 / 考试日期反复出现，解析结果缓存）。"""
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+def get_schedule() -> tuple[Course, ...]:
+    """获取本周课表（Mock 数据 + 持久化增删改合并，课表未变化时复用上次的合并结果）"""
+    return _schedule_overlay.view(
+        section_version("courses"),
+        lambda: (get_deleted_course_ids(), get_course_updates(), get_extra_courses()),
+    )
+
+_schedule_index: ScheduleIndex | None = None
 
-def get_schedule() -> list[dict]:
-    """获取本周课表（Mock 数据 + 持久化增删改合并）"""
-    base = [
-        {"id": 1, "weekday": "周一", "time": "08:30-10:05", "course": "高等数学 II",
-         "location": "教学楼 A-301", "teacher": "王教授", "type": "必修"},
-        {"id": 2, "weekday": "周一", "time": "14:00-15:35", "course": "大学物理",
-         "location": "实验楼 B-205", "teacher": "李教授", "type": "必修"},
-        {"id": 3, "weekday": "周二", "time": "10:15-11:50", "course": "Python 程序设计",
-         "location": "计算机楼 C-102", "teacher": "张教授", "type": "必修"},
-        {"id": 4, "weekday": "周二", "time": "14:00-15:35", "course": "体育（羽毛球）",
-         "location": "体育馆 B区", "teacher": "孙老师", "type": "必修"},
-        {"id": 5, "weekday": "周三", "time": "08:30-10:05", "course": "线性代数",
-         "location": "教学楼 A-405", "teacher": "陈教授", "type": "必修"},
-        {"id": 6, "weekday": "周三", "time": "14:00-15:35", "course": "英语听说",
-         "location": "外语楼 D-201", "teacher": "Emily", "type": "必修"},
-        {"id": 7, "weekday": "周四", "time": "10:15-11:50", "course": "数据结构",
-         "location": "计算机楼 C-301", "teacher": "刘教授", "type": "必修"},
-        {"id": 8, "weekday": "周四", "time": "14:00-17:00", "course": "物理实验",
-         "location": "实验楼 B-101", "teacher": "李教授", "type": "实验"},
-        {"id": 9, "weekday": "周五", "time": "08:30-10:05", "course": "思想政治理论",
-         "location": "教学楼 A-101", "teacher": "赵教授", "type": "必修"},
-        {"id": 10, "weekday": "周五", "time": "14:00-15:35", "course": "创新创业基础",
-         "location": "教学楼 A-501", "teacher": "周老师", "type": "选修"},
-    ]
-
-    # 1. 过滤已删除的 mock 课程
-    deleted_ids = get_deleted_course_ids()
-    schedule = [c for c in base if c["id"] not in deleted_ids]
-
-    # 2. 应用 mock 课程的字段修改
-    updates = get_course_updates()
-    for c in schedule:
-        cid_str = str(c["id"])
-        if cid_str in updates:
-            for k, v in updates[cid_str].items():
-                c[k] = v
-
-    # 3. 追加用户新增的课程
-    schedule.extend(get_extra_courses())
-
-    return schedule
-
-def get_today_schedule() -> list[dict]:
-    """获取今日课程，自动匹配星期几"""
-    weekday_map = {0: "周一", 1: "周二", 2: "周三",
-                   3: "周四", 4: "周五", 5: "周六", 6: "周日"}
-    today_weekday = weekday_map[datetime.now().weekday()]
+def get_schedule_index() -> ScheduleIndex:
+    """课表索引（ID / 星期 / 时间段），课表未变化时复用同一个索引"""
+    global _schedule_index
     schedule = get_schedule()
-    return [s for s in schedule if s["weekday"] == today_weekday]
+    index = _schedule_index
+    if index is None or index.courses is not schedule:
+        index = _schedule_index = ScheduleIndex(schedule)
+    return index
+
+def get_today_schedule() -> list[Course]:
+    """获取今日课程，自动匹配星期几（按上课时间排序）"""
+    today_weekday = Weekday.from_index(datetime.now().weekday())
+    return list(get_schedule_index().on(today_weekday))
 
 def get_finance() -> dict:
     """获取本月财务 Mock 数据（Day 2 增强 + 持久化合并）"""
-    base_spent = 1650.00
     budget = get_budget() or 2000.00
-    base_categories = {
-        "餐饮": 820.00,
-        "交通": 150.00,
-        "购物": 380.00,
-        "学习用品": 120.00,
-        "娱乐": 100.00,
-        "其他": 80.00,
-    }
-    base_transactions = [
-        {"date": "2026-02-20", "item": "食堂早餐", "amount": 7.00,
-         "category": "餐饮", "icon": "🍜"},
-        {"date": "2026-02-19", "item": "食堂午餐", "amount": 15.00,
-         "category": "餐饮", "icon": "🍜"},
-        {"date": "2026-02-19", "item": "超市零食", "amount": 23.50,
-         "category": "购物", "icon": "🛒"},
-        {"date": "2026-02-18", "item": "奶茶（一点点）", "amount": 18.00,
-         "category": "餐饮", "icon": "🧋"},
-        {"date": "2026-02-18", "item": "地铁充值", "amount": 50.00,
-         "category": "交通", "icon": "🚇"},
-        {"date": "2026-02-17", "item": "教材《数据结构》", "amount": 45.00,
-         "category": "学习用品", "icon": "📚"},
-        {"date": "2026-02-17", "item": "食堂晚餐", "amount": 18.00,
-         "category": "餐饮", "icon": "🍜"},
-        {"date": "2026-02-16", "item": "电影票《流浪地球3》", "amount": 39.90,
-         "category": "娱乐", "icon": "🎬"},
-        {"date": "2026-02-16", "item": "爆米花可乐", "amount": 28.00,
-         "category": "餐饮", "icon": "🍿"},
-        {"date": "2026-02-15", "item": "外卖（麻辣烫）", "amount": 25.00,
-         "category": "餐饮", "icon": "🥡"},
-        {"date": "2026-02-14", "item": "情人节礼物", "amount": 99.00,
-         "category": "购物", "icon": "🎁"},
-        {"date": "2026-02-13", "item": "打印资料", "amount": 8.50,
-         "category": "学习用品", "icon": "🖨️"},
-        {"date": "2026-02-12", "item": "食堂午餐", "amount": 14.00,
-         "category": "餐饮", "icon": "🍜"},
-        {"date": "2026-02-11", "item": "公交月卡", "amount": 50.00,
-         "category": "交通", "icon": "🚌"},
-        {"date": "2026-02-10", "item": "水果（苹果+香蕉）", "amount": 15.80,
-         "category": "餐饮", "icon": "🍎"},
-        {"date": "2026-02-09", "item": "理发", "amount": 35.00,
-         "category": "其他", "icon": "💇"},
-        {"date": "2026-02-08", "item": "网易云音乐会员", "amount": 15.00,
-         "category": "娱乐", "icon": "🎵"},
-        {"date": "2026-02-07", "item": "食堂晚餐", "amount": 16.00,
-         "category": "餐饮", "icon": "🍜"},
-        {"date": "2026-02-05", "item": "淘宝（数据线）", "amount": 19.90,
-         "category": "购物", "icon": "🛒"},
-        {"date": "2026-02-03", "item": "洗衣液+纸巾", "amount": 32.00,
-         "category": "其他", "icon": "🧴"},
-        {"date": "2026-02-01", "item": "开学聚餐AA", "amount": 68.00,
-         "category": "餐饮", "icon": "🍻"},
-    ]
 
     # 合并持久化的额外消费
     extra = get_extra_transactions()
-    extra_total = sum(t["amount"] for t in extra)
-    all_transactions = extra + base_transactions  # 新消费排在前面
+    extra_total = sum(t.amount for t in extra)
+    all_transactions = [*extra, *_BASE_TRANSACTIONS]  # 新消费排在前面
 
     # 更新类别统计
-    categories = dict(base_categories)
+    categories = dict(_BASE_CATEGORIES)
     for t in extra:
-        cat = t.get("category", "其他")
-        categories[cat] = categories.get(cat, 0) + t["amount"]
+        categories[t.category] = categories.get(t.category, 0) + t.amount
 
-    spent = base_spent + extra_total
+    spent = _BASE_SPENT + extra_total
     remaining = max(budget - spent, 0)
     today = datetime.now()
     _, days_in_month = monthrange(today.year, today.month)
@@ -190,20 +243,10 @@ def get_health() -> dict:
         mood = base_mood
     last_exercise = today.strftime("%Y-%m-%d") if exercise_today else base_last_exercise
 
-    # 过去 6 天的基础数据模板（从最近到最远）
-    _past_base = [
-        {"steps": 6210, "sleep": 7.0, "water": 6, "exercise": False, "mood": "🙂"},
-        {"steps": 3800, "sleep": 5.5, "water": 3, "exercise": False, "mood": "😫"},
-        {"steps": 7500, "sleep": 7.5, "water": 7, "exercise": False, "mood": "😊"},
-        {"steps": 5100, "sleep": 6.0, "water": 5, "exercise": False, "mood": "😐"},
-        {"steps": 10200, "sleep": 7.0, "water": 8, "exercise": True, "mood": "😄"},
-        {"steps": 8900, "sleep": 8.0, "water": 6, "exercise": False, "mood": "😊"},
-    ]
-
     # 动态计算本周运动次数（mock 历史 + 持久化计数）
     week_start_date = (today - timedelta(days=today.weekday())).date()
     base_exercise_week = 0
-    for i, past in enumerate(_past_base):
+    for i, past in enumerate(_PAST_HEALTH):
         day = (today - timedelta(days=i + 1)).date()
         if day >= week_start_date and past.get("exercise"):
             base_exercise_week += 1
@@ -225,11 +268,9 @@ def get_health() -> dict:
         "mood": mood_short,
     }
     history = [today_entry]
-    for i, base in enumerate(_past_base):
+    for i, past in enumerate(_PAST_HEALTH):
         day = today - timedelta(days=i + 1)
-        entry = dict(base)
-        entry["date"] = day.strftime("%Y-%m-%d")
-        history.append(entry)
+        history.append({**past, "date": day.strftime("%Y-%m-%d")})
 
     return {
         "today_steps": steps,
@@ -248,61 +289,25 @@ def get_health() -> dict:
         "history": history,
     }
 
-def get_todos() -> list[dict]:
+def get_todos() -> list[Todo]:
     """获取待办事项 Mock 数据，合并持久化的完成状态覆盖。截止日期超过 7 天的待办自动移除。"""
-    todos = [
-        {"id": 1, "task": "提交高数作业", "deadline": "2026-02-20",
-         "priority": "🔴 紧急", "done": False, "category": "学业"},
-        {"id": 2, "task": "复习线性代数期中", "deadline": "2026-02-26",
-         "priority": "🟡 重要", "done": False, "category": "学业"},
-        {"id": 3, "task": "Python 实验报告", "deadline": "2026-02-22",
-         "priority": "🟡 重要", "done": False, "category": "学业"},
-        {"id": 4, "task": "归还图书馆的书", "deadline": "2026-02-21",
-         "priority": "🟢 普通", "done": False, "category": "生活"},
-        {"id": 5, "task": "社团例会", "deadline": "2026-02-20",
-         "priority": "🟢 普通", "done": True, "category": "社交"},
-        {"id": 6, "task": "给妈妈打电话", "deadline": "2026-02-21",
-         "priority": "🟢 普通", "done": False, "category": "生活"},
-        {"id": 7, "task": "洗衣服", "deadline": "2026-02-20",
-         "priority": "🟢 普通", "done": False, "category": "生活"},
-    ]
-    # 合并持久化的完成状态
-    overrides = get_todo_overrides()
-    for t in todos:
-        tid = str(t["id"])
-        if tid in overrides:
-            t["done"] = overrides[tid]
+    # 合并持久化的完成状态 + 用户通过 Agent 新增的待办（待办未变化时复用上次的合并结果）
+    todos = _todo_overlay.view(section_version("todos"), _load_todo_overlay)
 
-    # 合并用户通过 Agent 新增的待办
-    extra = get_extra_todos()
-    for t in extra:
-        tid = str(t["id"])
-        if tid in overrides:
-            t["done"] = overrides[tid]
-    todos.extend(extra)
+    # 过滤掉截止日期超过 7 天的待办（自动清理过期项；与日期有关，每次调用时过滤）
+    cutoff = datetime.now().date() - timedelta(days=7)
+    return [t for t in todos if _parse_date(t.deadline) >= cutoff]
 
-    # 过滤掉截止日期超过 7 天的待办（自动清理过期项）
-    today = datetime.now().date()
-    cutoff = today - timedelta(days=7)
-    todos = [t for t in todos if datetime.strptime(t["deadline"], "%Y-%m-%d").date() >= cutoff]
-
-    return todos
+def _load_todo_overlay():
+    overrides = get_todo_overrides()
+    return (), {tid: {"done": done} for tid, done in overrides.items()}, get_extra_todos()
 
 def get_upcoming_exams() -> list[dict]:
     """获取考试安排 Mock 数据（动态计算倒计时，过滤已过期考试）"""
     today = datetime.now().date()
-    raw = [
-        {"course": "线性代数", "date": "2026-02-26",
-         "location": "教学楼 A-101", "type": "期中考试"},
-        {"course": "高等数学 II", "date": "2026-03-05",
-         "location": "教学楼 A-301", "type": "期中考试"},
-        {"course": "大学物理", "date": "2026-03-12",
-         "location": "实验楼 B-205", "type": "期中考试"},
-    ]
     exams = []
-    for e in raw:
-        exam_date = datetime.strptime(e["date"], "%Y-%m-%d").date()
-        days_left = (exam_date - today).days
+    for e in _EXAMS:
+        days_left = (_parse_date(e["date"]) - today).days
         if days_left >= 0:
             exams.append({**e, "days_left": days_left, "is_today": days_left == 0})
     return exams
@@ -315,73 +320,47 @@ def get_travel_plan() -> dict | None:
     if overrides.get("deleted"):
         return None
 
-    base = {
-        "trip_name": "周末深圳一日游 🏖️",
-        "date": "2026-03-01",
-        "budget": 300.00,
-        "status": "计划中",
-        "companions": ["室友小李", "同学小王"],
-        "packing_list": ["充电宝", "防晒霜", "学生证（门票优惠）", "水杯", "零食"],
-    }
-
-    base_itinerary = [
-        {"time": "08:00", "activity": "学校出发（地铁）",
-         "location": "大学城站", "cost": 8.00, "icon": "🚇"},
-        {"time": "09:30", "activity": "到达世界之窗",
-         "location": "世界之窗", "cost": 0, "icon": "🏰"},
-        {"time": "09:30-12:00", "activity": "游玩世界之窗",
-         "location": "世界之窗", "cost": 80.00, "icon": "🎢"},
-        {"time": "12:00-13:00", "activity": "午餐（海岸城）",
-         "location": "海岸城购物中心", "cost": 60.00, "icon": "🍱"},
-        {"time": "13:30-16:00", "activity": "深圳湾公园骑行",
-         "location": "深圳湾公园", "cost": 30.00, "icon": "🚴"},
-        {"time": "16:30-18:00", "activity": "海岸城逛街",
-         "location": "海岸城购物中心", "cost": 50.00, "icon": "🛍️"},
-        {"time": "18:00-19:00", "activity": "晚餐",
-         "location": "海岸城美食区", "cost": 55.00, "icon": "🍜"},
-        {"time": "19:30", "activity": "返程（地铁）",
-         "location": "后海站", "cost": 8.00, "icon": "🚇"},
-    ]
-
-    # 1. 应用顶层字段覆盖（排除内部标记字段）
+    # 1. 应用顶层字段覆盖（排除内部标记字段）；列表字段转为 tuple，调用方拿到的都是只读视图
+    plan = dict(_BASE_TRAVEL)
     for key in ("trip_name", "date", "budget", "status", "companions", "packing_list"):
         if key in overrides:
-            base[key] = overrides[key]
-
-    # 确保 companions 是列表（LLM 可能传入字符串）
-    if isinstance(base["companions"], str):
-        base["companions"] = [c.strip() for c in base["companions"].replace("，", "、").split("、") if c.strip()]
+            value = overrides[key]
+            plan[key] = tuple(value) if isinstance(value, list) else value
 
     # 2. 行程列表：过滤已删除 → 应用修改 → 追加新增
-    deleted_idxs = get_deleted_itinerary_idxs()
-    updates = get_itinerary_updates()
-    itinerary = []
-    for i, stop in enumerate(base_itinerary):
-        if i in deleted_idxs:
-            continue
-        # 应用修改
-        idx_str = str(i)
-        if idx_str in updates:
-            stop = dict(stop)
-            for k, v in updates[idx_str].items():
-                stop[k] = v
-        itinerary.append(stop)
-
-    # 追加用户新增的行程
-    itinerary.extend(get_extra_itinerary())
+    itinerary = _itinerary_overlay.view(
+        section_version("travel"),
+        lambda: (get_deleted_itinerary_idxs(), get_itinerary_updates(), get_extra_itinerary()),
+    )
 
     # 3. 重新计算总预估花费
-    total_cost = sum(s.get("cost", 0) for s in itinerary)
-
-    base["itinerary"] = itinerary
-    base["total_estimated_cost"] = total_cost
-    return base
+    total_cost = sum(s.cost for s in itinerary)
+
+    plan["itinerary"] = itinerary
+    plan["total_estimated_cost"] = total_cost
+    return plan
+
+_itinerary_index: tuple[tuple[ItineraryStop, ...], IntervalIndex] | None = None
+
+def get_itinerary_index(itinerary: tuple[ItineraryStop, ...]) -> IntervalIndex[tuple[int, ItineraryStop]]:
+    """行程站点的区间索引（条目为 (显示序号, 站点)），同一份行程复用同一个索引；时间无法解析的站点不参与冲突检查"""
+    global _itinerary_index
+    cached = _itinerary_index
+    if cached is None or cached[0] is not itinerary:
+        entries = []
+        for i, stop in enumerate(itinerary):
+            interval = parse_interval(stop.time)
+            if interval is not None:
+                entries.append((interval, (i, stop)))
+        cached = _itinerary_index = (itinerary, IntervalIndex(entries))
+    return cached[1]
 
 def get_alerts() -> list[dict]:
     """
     智能提醒生成器
     基于当前数据自动判断需要提醒的事项。
-    注意：message 使用 HTML 标签（<strong>），因为渲染路径是 unsafe_allow_html。
+    注意：message 使用 HTML 标签（<strong>），因为渲染路径是 unsafe_allow_html；
+    其中插入的用户数据（课程名、地点、待办内容等）一律先 html.escape。
     """
     alerts = []
     finance = get_finance()
@@ -412,9 +391,9 @@ def get_alerts() -> list[dict]:
                 "icon": "📝",
                 "title": f"{exam['course']}考试倒计时",
                 "message": (
-                    f"{exam['course']} {exam['type']}还有 "
+                    f"{html.escape(exam['course'])} {html.escape(exam['type'])}还有 "
                     f"<strong>{exam['days_left']} 天</strong>！"
-                    f"地点：{exam['location']}。建议制定复习计划。"
+                    f"地点：{html.escape(exam['location'])}。建议制定复习计划。"
                 ),
                 "severity": "high" if exam["days_left"] <= 3 else "medium",
             })
@@ -444,7 +423,7 @@ def get_alerts() -> list[dict]:
             "title": "睡眠不足",
             "message": (
                 f"昨晚只睡了 <strong>{health['sleep_hours']} 小时</strong>，"
-                f"质量「{health['sleep_quality']}」。"
+                f"质量「{html.escape(health['sleep_quality'])}」。"
                 f"建议今晚 11 点前上床休息哦。"
             ),
             "severity": "low",
@@ -464,9 +443,9 @@ def get_alerts() -> list[dict]:
         })
 
     # 紧急待办提醒
-    urgent_todos = [t for t in todos if not t["done"] and "紧急" in t["priority"]]
+    urgent_todos = [t for t in todos if not t.done and "紧急" in t.priority]
     if urgent_todos:
-        tasks = "、".join([t["task"] for t in urgent_todos])
+        tasks = "、".join([html.escape(t.task) for t in urgent_todos])
         alerts.append({
             "type": "todo",
             "icon": "🔥",
@@ -517,26 +496,24 @@ def build_context_summary() -> dict:
     )
 
     # 待办摘要
-    pending = [t for t in todos if not t["done"]]
-    urgent = [t for t in pending if "紧急" in t["priority"]]
+    pending = [t for t in todos if not t.done]
+    urgent = [t for t in pending if "紧急" in t.priority]
     todo_summary = (
         f"待办 {len(pending)} 项"
         f"{'，其中 ' + str(len(urgent)) + ' 项紧急！' if urgent else '。'}"
     )
     for t in pending:
-        todo_summary += f"\n  - {t['priority']} {t['task']}（截止 {t['deadline']}）"
+        todo_summary += f"\n  - {t.priority} {t.task}（截止 {t.deadline}）"
 
     # 课程摘要
     today_courses = get_today_schedule()
-    weekday_map = {0: "周一", 1: "周二", 2: "周三",
-                   3: "周四", 4: "周五", 5: "周六", 6: "周日"}
-    today_weekday = weekday_map[datetime.now().weekday()]
+    today_weekday = Weekday.from_index(datetime.now().weekday())
 
     if today_courses:
         schedule_summary = f"今天（{today_weekday}）有 {len(today_courses)} 节课：\n"
         for c in today_courses:
             schedule_summary += (
-                f"  - {c['time']} {c['course']}（{c['location']}）\n"
+                f"  - {c.time} {c.course}（{c.location}）\n"
             )
     else:
         schedule_summary = f"今天（{today_weekday}）没有课，可以自由安排 🎉"
@@ -565,7 +542,7 @@ def build_context_summary() -> dict:
     if alerts:
         alert_summary = "当前提醒：\n"
         for a in alerts:
-            clean_msg = re.sub(r"<[^>]+>", "", a["message"])
+            clean_msg = html.unescape(re.sub(r"<[^>]+>", "", a["message"]))
             alert_summary += f"  - {a['icon']} {a['title']}：{clean_msg}\n"
     else:
         alert_summary = "当前没有需要特别关注的事项 ✅"
@@ -0,0 +1,62 @@
+"""
+UniLife OS — 写时复制覆盖层（基础数据 + 用户修改）
+课表、行程、待办都是「不可变的 mock 基础记录 + 持久化的用户修改」：删除若干条、修改若干字段、追加新记录。
+Overlay 统一完成这类合并：删除集合与修改字典按 key 查找，合并一次 O(基础 + 修改)，
+未被修改的记录原样复用，只有确实改变了字段的记录生成新对象；
+合并结果保持基础记录在前、追加记录在后的顺序，按数据版本缓存，版本不变时直接复用。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Generic, Hashable, Iterable, Mapping, Sequence, TypeVar
+
+R = TypeVar("R")
+
+
+class Overlay(Generic[R]):
+    """
+    基础记录的覆盖层合并视图。
+    key(position, record) 给出记录在修改数据里的标识（转为 str 比较，与 JSON 中的 key 一致）；
+    position 为记录在「基础记录 + 追加记录」中的序号，按位置标识的数据（如行程站点）用它，按 ID 标识的忽略即可。
+    删除与修改同样作用于追加记录（如用户新增待办的完成状态）。
+    """
+
+    def __init__(self, base: Sequence[R], key: Callable[[int, R], Hashable]):
+        self._base = tuple(base)
+        self._key = key
+        self._lock = threading.Lock()
+        self._version: Hashable = None
+        self._view: tuple[R, ...] = ()
+
+    def view(
+        self,
+        version: Hashable,
+        load: Callable[[], tuple[Iterable, Mapping[str, dict], Iterable[R]]],
+    ) -> tuple[R, ...]:
+        """
+        返回合并后的记录。version 与上次相同时直接复用缓存结果，不调用 load；
+        否则调用 load() 取得 (删除的 key, {key: 字段修改}, 追加记录) 重新合并。
+        """
+        with self._lock:
+            if version is not None and version == self._version:
+                return self._view
+
+        deleted, updates, extras = load()
+        view = tuple(self._merge({str(k) for k in deleted}, updates, extras).values())
+
+        with self._lock:
+            self._version = version
+            self._view = view
+        return view
+
+    def _merge(self, deleted: set[str], updates: Mapping[str, dict], extras: Iterable[R]) -> dict[str, R]:
+        merged = {}
+        for position, record in enumerate((*self._base, *extras)):
+            key = str(self._key(position, record))
+            if key in deleted:
+                continue
+            changes = updates.get(key)
+            if changes and any(getattr(record, k, v) != v for k, v in changes.items()):
+                record = record.updated(changes)
+            merged[key] = record
+        return merged
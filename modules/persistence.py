@@ -1,81 +1,518 @@
 """
 UniLife OS — JSON 数据持久化层
 设计原则：mock_data 提供基础数据，persistence 只保存用户的增量修改。
-存储文件：data/user_data.json
+存储文件：按数据分区拆成多个 JSON 分片 data/<section>.json（health / finance / todos / courses /
+travel / settings / idempotency），每个分片独立读写、独立原子替换，改一处只重写一个小文件；
+分片在进程内常驻内存（写后缓冲）：修改立即对本进程可见，由后台定时器合并后落盘，退出时兜底刷盘；
+对话历史单独存放在 data/chat_log.jsonl + chat_log.idx，工具调用结果按内容哈希存放在 data/tool_blobs/。
 """
 from __future__ import annotations
 
-import json
+import atexit
+import copy
+import hashlib
 import tempfile
 import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Callable
+from concurrent.futures import Future
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from modules import serializer
+from modules.records import Course, ItineraryStop, Todo, Transaction
+from config import PERSIST_DURABILITY, PERSIST_GROUP_COMMIT_MS, PERSIST_FLUSH_DELAY_MS
+
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-DATA_FILE = DATA_DIR / "user_data.json"
-
-_DEFAULT_DATA = {
-    "todos": {},            # {todo_id: bool} — 完成状态覆盖
-    "extra_transactions": [],  # 用户新增的消费记录
-    "health_overrides": {},    # {"water_cups": n, "exercise_today": bool, "mood": "..."}
-    "chat_messages": [],       # 对话历史
-    "packing_checked": [],     # 旅行必带清单已勾选项
-    "extra_todos": [],         # 用户通过 Agent 新增的待办事项
-    "extra_courses": [],       # 用户新增的课程
-    "deleted_course_ids": [],  # 被删除的 mock 课程 ID
-    "course_updates": {},      # {course_id: {field: new_value}} 课程修改记录
-    "monthly_budget": None,    # 月预算（None 表示未设置，用 mock 默认值 2000）
-    "exercise_weekly": {"week_start": None, "count": 0},  # 本周运动计数（跨天累计、跨周重置）
-    "exercise_goal": None,        # 每周运动目标次数（None 表示未设置，默认 3）
-    "travel_overrides": {},       # {field: new_value} 旅行计划顶层字段覆盖
-    "extra_itinerary": [],        # 用户新增的行程站点
-    "deleted_itinerary_idxs": [], # 被删除的 mock 行程站点索引
-    "itinerary_updates": {},      # {idx_str: {field: value}} 行程站点修改
+DATA_FILE = DATA_DIR / "user_data.json"       # 旧版单文件存储：schema v1 迁移拆分为分片后改名为 .bak
+CHAT_LOG_FILE = DATA_DIR / "chat_log.jsonl"   # 对话日志：每行一条消息，只追加
+CHAT_INDEX_FILE = DATA_DIR / "chat_log.idx"   # 每条消息在日志中的起始字节偏移（定长 8 字节）
+BLOB_DIR = DATA_DIR / "tool_blobs"            # 工具结果：<sha256>.z，zlib 压缩的文本
+BLOB_GC_GRACE_SECONDS = 300  # 最近写入 / 复用过的 blob 不回收：可能属于尚未落盘的新消息
+SCHEMA_FILE = DATA_DIR / "schema.json"        # {"schema_version": n}，见下方迁移注册表
+
+# 各分片包含的 key 及默认值
+_SECTIONS = {
+    "health": {
+        "health_overrides": {},    # {"water_cups": n, "exercise_today": bool, "mood": "..."}
+        "exercise_weekly": {"week_start": None, "count": 0},  # 本周运动计数（跨天累计、跨周重置）
+    },
+    "finance": {
+        "extra_transactions": [],  # 用户新增的消费记录
+    },
+    "todos": {
+        "todos": {},               # {todo_id: bool} — 完成状态覆盖
+        "extra_todos": [],         # 用户通过 Agent 新增的待办事项
+    },
+    "courses": {
+        "extra_courses": [],       # 用户新增的课程
+        "deleted_course_ids": [],  # 被删除的 mock 课程 ID
+        "course_updates": {},      # {course_id: {field: new_value}} 课程修改记录
+    },
+    "travel": {
+        "packing_checked": [],        # 旅行必带清单已勾选项
+        "travel_overrides": {},       # {field: new_value} 旅行计划顶层字段覆盖
+        "extra_itinerary": [],        # 用户新增的行程站点
+        "deleted_itinerary_idxs": [], # 被删除的 mock 行程站点索引
+        "itinerary_updates": {},      # {idx_str: {field: value}} 行程站点修改
+    },
+    "settings": {
+        "monthly_budget": None,    # 月预算（None 表示未设置，用 mock 默认值 2000）
+        "exercise_goal": None,     # 每周运动目标次数（None 表示未设置，默认 3）
+    },
+    "idempotency": {
+        "idempotency_keys": {},    # {key: result} 最近写工具调用的幂等键（插入顺序即新旧顺序）
+    },
 }
 
+MAX_IDEMPOTENCY_KEYS = 200  # 幂等键保留上限，只需覆盖最近的重试 / rerun 窗口
 
-def load_user_data() -> dict:
-    """从 JSON 加载用户数据，不存在则用默认结构初始化。"""
-    if DATA_FILE.exists():
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            # 确保所有 key 都存在（兼容旧版本文件）
-            for key, default in _DEFAULT_DATA.items():
-                data.setdefault(key, default if not isinstance(default, (list, dict)) else type(default)(default))
-            return data
-        except (json.JSONDecodeError, IOError):
-            return _init_default_data()
-    return _init_default_data()
-
-
-def save_user_data(data: dict):
-    """保存用户数据到 JSON 文件（原子写入：先写临时文件再重命名，防止写入中断导致数据损坏）。"""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+# ========== 落盘策略（durability）==========
+# 所有写入都先写临时文件，再经 _commit_files 按当前策略提交：
+#   none  — 直接原子改名；fsync — 先 fsync 临时文件，改名后再 fsync 目录；
+#   group — 交给组提交线程，每个窗口最多落盘一批：窗口内所有会话的写入一起 fsync / 改名 / fsync 目录，
+#           再统一唤醒（fsync 次数上限为每秒 1000 / 窗口毫秒数）。
+
+DURABILITY_MODES = ("none", "fsync", "group")
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(directory: Path):
+    """fsync 目录，让改名本身落盘（Windows 不支持打开目录，直接跳过）。"""
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
     try:
-        fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _apply_commit(items: list[tuple[str | None, Path]], sync: bool):
+    """
+    提交一批写入：items 中 (临时文件, 目标文件) 表示改名替换，(None, 文件) 表示追加写后只需 fsync。
+    同一目标被多次替换时只有最后一份会留下，之前的临时文件直接丢弃、不必 fsync。
+    sync 为 False 时只改名不 fsync。
+    """
+    latest: dict[Path, str | None] = {}
+    for tmp_path, path in items:
+        previous = latest.get(path)
+        if previous is not None and tmp_path is not None:
+            os.unlink(previous)
+        if tmp_path is not None or path not in latest:
+            latest[path] = tmp_path
+    if sync:
+        for path, tmp_path in latest.items():
+            _fsync_file(tmp_path or path)
+    dirs = set()
+    for path, tmp_path in latest.items():
+        if tmp_path is not None:
+            os.replace(tmp_path, path)
+            dirs.add(path.parent)
+    if sync:
+        for directory in dirs:
+            _fsync_dir(directory)
+
+
+class _GroupCommitter:
+    """组提交：攒一个时间窗口内的全部写入，一次性落盘后唤醒所有等待的调用方。"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: list[tuple[tuple[str | None, Path], Future]] = []
+        self._thread = None
+        self._last_commit = 0.0
+        self.batches = 0
+        self.commits = 0
+
+    def submit(self, items: list[tuple[str | None, Path]]):
+        """提交并阻塞等待所在批次落盘；落盘失败时抛出对应异常。"""
+        futures = []
+        with self._cond:
+            for item in items:
+                future = Future()
+                self._pending.append((item, future))
+                futures.append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence-group-commit", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        for future in futures:
+            future.result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # 两批之间至少间隔一个窗口：窗口内到达的并发写入搭上同一批，空闲时则立即提交
+            delay = _group_commit_ms / 1000 - (time.monotonic() - self._last_commit)
+            if delay > 0:
+                time.sleep(delay)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                _apply_commit([item for item, _ in batch], sync=True)
+            except BaseException as e:
+                for (tmp_path, _), future in batch:
+                    if tmp_path is not None and os.path.exists(tmp_path):
+                        try:
+                            os.unlink(tmp_path)
+                        except OSError:
+                            pass
+                    future.set_exception(e)
+            else:
+                for _, future in batch:
+                    future.set_result(None)
+            self._last_commit = time.monotonic()
+            self.batches += 1
+            self.commits += len(batch)
+
+
+_group_committer = _GroupCommitter()
+_durability = "none"
+_group_commit_ms = 10.0
+
+
+def set_durability(mode: str, group_commit_ms: float | None = None):
+    """切换落盘策略（none / fsync / group），group_commit_ms 为组提交窗口。"""
+    global _durability, _group_commit_ms
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"未知的落盘策略: {mode}（可选 {', '.join(DURABILITY_MODES)}）")
+    _durability = mode
+    if group_commit_ms is not None:
+        _group_commit_ms = float(group_commit_ms)
+
+
+def get_durability_stats() -> dict:
+    """当前落盘策略与组提交统计（批次数、提交数、平均每批提交数）。"""
+    batches = _group_committer.batches
+    return {
+        "mode": _durability,
+        "group_commit_ms": _group_commit_ms,
+        "batches": batches,
+        "commits": _group_committer.commits,
+        "avg_batch_size": _group_committer.commits / batches if batches else 0.0,
+    }
+
+
+def _commit_files(items: list[tuple[str | None, Path]]):
+    """按当前落盘策略提交写入，返回时数据已按策略要求落盘。"""
+    if _durability == "group":
+        _group_committer.submit(items)
+    else:
+        _apply_commit(items, sync=_durability == "fsync")
+
+
+def _write_tmp(directory: Path, payload: bytes) -> str:
+    """在目标目录写好临时文件（与目标同目录，保证改名是原子的）。"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+    except BaseException:
         try:
-            with os.fdopen(fd, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            os.replace(tmp_path, DATA_FILE)
-        except BaseException:
-            # 写入失败时清理临时文件
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return tmp_path
+
+
+def _replace_files(payloads: list[tuple[Path, bytes]]):
+    """原子替换一组文件：先全部写成临时文件，再按顺序提交改名。"""
+    items = []
+    try:
+        for path, payload in payloads:
+            items.append((_write_tmp(path.parent, payload), path))
+        _commit_files(items)
+    except BaseException:
+        for tmp_path, _ in items:
             try:
                 os.unlink(tmp_path)
             except OSError:
                 pass
-            raise
-    except OSError as e:
-        # 写入权限或磁盘空间不足时，打印警告但不崩溃
+        raise
+
+
+set_durability(PERSIST_DURABILITY, PERSIST_GROUP_COMMIT_MS)
+
+
+# ========== 写后缓冲（write-behind）==========
+# 分片首次读取后常驻 _doc，之后的读写都在内存里完成（本进程内读己之写）；
+# save_section 只把分片标脏，后台定时器在 PERSIST_FLUSH_DELAY_MS 内把期间的所有修改合并成一次写入。
+# 所有修改都在 _doc_lock 内进行（见 _mutation），刷盘时序列化也在锁内，保证写出的是一致的状态。
+
+_doc_lock = threading.RLock()
+_doc: dict[str, dict] = {}
+_dirty: set[str] = set()
+_versions: dict[str, int] = {}  # 各分片在本进程内的修改版本号，见 section_version
+_flush_timer: threading.Timer | None = None
+_flush_failures = 0  # 连续刷盘失败次数：决定重试退避时长，也用于每轮失败只告警一次
+_FLUSH_MAX_BACKOFF_S = 30.0  # 持续写入失败时重试间隔的上限
+_flush_lock = threading.Lock()  # 串行化刷盘，避免旧版本覆盖新版本
+
+
+def _mutation(fn):
+    """写操作装饰器：整个读-改-写在 _doc_lock 内完成，与刷盘、其他会话的修改互斥。"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _doc_lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def user_data_snapshot():
+    """在 with 块内暂停其他线程的修改，多个 getter 组合查询时看到的是同一时刻的数据。可嵌套。"""
+    with _doc_lock:
+        yield
+
+
+def _schedule_flush(delay: float | None = None):
+    """安排一次后台刷盘（秒；默认 PERSIST_FLUSH_DELAY_MS）。已有定时器时不重复安排，退避中的重试不会被新的修改提前。"""
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(PERSIST_FLUSH_DELAY_MS / 1000 if delay is None else delay, flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def flush():
+    """把所有脏分片立即写盘（后台定时器、进程退出时调用；也可手动调用）。"""
+    global _flush_timer, _flush_failures
+    with _flush_lock:
+        with _doc_lock:
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+            names = sorted(_dirty)
+            _dirty.clear()
+            payloads = [
+                (name, serializer.dumps({k: _doc[name][k] for k in _SECTIONS[name] if k in _doc[name]}))
+                for name in names
+            ]
+        failed, error = [], None
+        for name, payload in payloads:
+            try:
+                _write_section_file(name, payload)
+            except OSError as e:
+                failed.append(name)
+                error = e
         import sys
-        print(f"[persistence] 写入失败: {e}", file=sys.stderr)
+        if failed:
+            # 写入失败的分片重新标脏，按指数退避稍后重试（期间的修改仍在内存中，不会丢失）；
+            # 写入权限或磁盘空间不足时只在连续失败的第一次告警，不刷屏
+            with _doc_lock:
+                _dirty.update(failed)
+                _flush_failures += 1
+                if _flush_failures == 1:
+                    print(f"[persistence] 写入失败，将退避重试: {error}", file=sys.stderr)
+                delay = min(PERSIST_FLUSH_DELAY_MS / 1000 * 2 ** _flush_failures, _FLUSH_MAX_BACKOFF_S)
+                _schedule_flush(delay)
+        elif _flush_failures and payloads:
+            print(f"[persistence] 写入恢复（此前连续失败 {_flush_failures} 次）", file=sys.stderr)
+            _flush_failures = 0
+
+
+atexit.register(flush)
+
+
+def _section_file(name: str) -> Path:
+    return DATA_DIR / (name + ".json")
+
+
+def load_section(name: str) -> dict:
+    """
+    获取单个分片（进程内共享的同一对象，修改后需调用 save_section）。
+    首次访问时从磁盘读取：文件已由 schema 迁移升级到当前结构，这里不再做任何兼容处理；
+    不存在或损坏时为默认结构（不落盘，首次写入时才创建文件）。
+    """
+    with _doc_lock:
+        data = _doc.get(name)
+        if data is None:
+            _ensure_schema()
+            data = _read_section_file(name)
+            if data is None:
+                data = copy.deepcopy(_SECTIONS[name])
+            _doc[name] = data
+            _versions[name] = _versions.get(name, 0) + 1
+        return data
+
+
+def _read_section_file(name: str) -> dict | None:
+    try:
+        with open(_section_file(name), "rb") as f:
+            return serializer.loads(f.read())
+    except (FileNotFoundError, IOError, *serializer.DecodeError):
+        return None
+
+
+def save_section(name: str, data: dict):
+    """标记分片已修改：立即对本进程可见，稍后由后台定时器合并落盘。"""
+    with _doc_lock:
+        _doc[name] = data
+        _versions[name] = _versions.get(name, 0) + 1
+        _dirty.add(name)
+        _schedule_flush()
+
+
+def section_version(name: str) -> int:
+    """
+    分片的修改版本号：每次加载 / save_section 都会递增，供上层按版本缓存由分片派生的结果。
+    须在读取分片内容之前取版本号：读取期间若有并发修改，缓存只会偏旧一个版本，下次调用即重新计算。
+    """
+    load_section(name)  # 确保已加载，避免首次加载带来的版本跳变让缓存白白失效一次
+    return _versions[name]
+
+
+def _write_section_file(name: str, payload: bytes):
+    """原子写入分片文件（先写临时文件再重命名，防止写入中断导致数据损坏）。失败时抛 OSError，由调用方决定重试或中止。"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    _replace_files([(_section_file(name), payload)])
 
 
-def _init_default_data() -> dict:
-    """用默认结构初始化并保存。"""
-    data = {k: (type(v)(v) if isinstance(v, (list, dict)) else v) for k, v in _DEFAULT_DATA.items()}
-    save_user_data(data)
-    return data
+def _read_copy(name: str, key: str, default):
+    """
+    在锁内取分片中某一项的深拷贝。
+    写后缓冲下分片是进程内共享的活对象：直接返回会让调用方遍历时撞上其他会话的并发修改。
+    """
+    with _doc_lock:
+        return copy.deepcopy(load_section(name).get(key, default))
+
+
+# ========== Schema 版本迁移 ==========
+# 数据目录的结构版本记录在 schema.json。每个迁移把 n-1 版升级到 n 版并立即落盘，
+# 进程首次访问数据时按版本号依次执行一次；之后的读路径不再做任何兼容处理。
+# 修改存储结构（新增 key、改字段形状）时：在此注册新的迁移函数并递增 SCHEMA_VERSION。
+
+SCHEMA_VERSION = 4
+_MIGRATIONS: dict[int, Callable[[], None]] = {}
+_schema_lock = threading.Lock()
+_schema_checked = False
+
+
+def _migration(version: int):
+    def register(fn):
+        _MIGRATIONS[version] = fn
+        return fn
+    return register
+
+
+def _read_schema_version() -> int:
+    try:
+        with open(SCHEMA_FILE, "rb") as f:
+            return int(serializer.loads(f.read())["schema_version"])
+    except (FileNotFoundError, IOError, KeyError, TypeError, ValueError, *serializer.DecodeError):
+        return 0
+
+
+def _ensure_schema():
+    """把数据目录升级到 SCHEMA_VERSION（每个进程只检查一次，每个迁移在数据目录上只执行一次）。"""
+    global _schema_checked
+    if _schema_checked:
+        return
+    with _schema_lock:
+        if _schema_checked:
+            return
+        version = _read_schema_version()
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"数据目录的 schema 版本 {version} 高于程序支持的 {SCHEMA_VERSION}，请升级程序后再运行"
+            )
+        try:
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                _MIGRATIONS[target]()
+                SCHEMA_FILE.parent.mkdir(parents=True, exist_ok=True)
+                _replace_files([(SCHEMA_FILE, serializer.dumps({"schema_version": target}))])
+        except OSError as e:
+            # 迁移中途写入失败：版本号停在最后一个完成的迁移，源数据保持原样，下次启动时重试
+            import sys
+            print(f"[persistence] schema 迁移失败: {e}", file=sys.stderr)
+        _schema_checked = True
+
+
+def _rewrite_sections(upgrade: Callable[[str, dict], dict]):
+    """迁移辅助：对每个已存在的分片文件执行 upgrade(name, data) 并写回。"""
+    for name in _SECTIONS:
+        data = _read_section_file(name)
+        if data is not None:
+            _write_section_file(name, serializer.dumps(upgrade(name, data)))
+
+
+@_migration(1)
+def _split_legacy_file():
+    """v1：旧版单文件 user_data.json 拆分为各分片（已存在的分片不覆盖），对话历史转入对话日志。"""
+    if not DATA_FILE.exists():
+        return
+    try:
+        with open(DATA_FILE, "rb") as f:
+            legacy = serializer.loads(f.read())
+    except (IOError, *serializer.DecodeError):
+        legacy = {}
+    for name, defaults in _SECTIONS.items():
+        if not _section_file(name).exists():
+            section = {k: legacy[k] for k in defaults if k in legacy}
+            _write_section_file(name, serializer.dumps(section))
+    if legacy.get("chat_messages") and not CHAT_LOG_FILE.exists():
+        _write_chat_log(legacy["chat_messages"][-MAX_PERSISTED_MESSAGES:])
+    os.replace(DATA_FILE, DATA_FILE.with_suffix(".json.bak"))
+
+
+@_migration(2)
+def _backfill_defaults():
+    """v2：补齐各分片缺失的 key（此前每次读取时临时补齐）。"""
+    def upgrade(name, data):
+        for key, default in _SECTIONS[name].items():
+            if key not in data:
+                data[key] = copy.deepcopy(default)
+        return data
+    _rewrite_sections(upgrade)
+
+
+@_migration(3)
+def _normalize_health_overrides():
+    """
+    v3：health_overrides 必须带合法的 override_date（YYYY-MM-DD）。
+    早期文件里没有日期或格式不对的覆盖在读取时本就被视为过期，这里直接清空。
+    """
+    def upgrade(name, data):
+        if name == "health":
+            overrides = data.get("health_overrides") or {}
+            try:
+                datetime.strptime(str(overrides.get("override_date")), "%Y-%m-%d")
+            except ValueError:
+                data["health_overrides"] = {}
+        return data
+    _rewrite_sections(upgrade)
+
+
+@_migration(4)
+def _normalize_travel_companions():
+    """v4：旅行同行人统一存为列表（LLM 可能传入「小李、小王」这样的字符串，此前在读取时才拆分）。"""
+    def upgrade(name, data):
+        overrides = data.get("travel_overrides", {})
+        if name == "travel" and isinstance(overrides.get("companions"), str):
+            overrides["companions"] = _split_companions(overrides["companions"])
+        return data
+    _rewrite_sections(upgrade)
+
+
+def _split_companions(text: str) -> list[str]:
+    return [c.strip() for c in text.replace("，", "、").split("、") if c.strip()]
 
 
 # ========== 便捷操作函数 ==========
@@ -89,58 +526,58 @@ def _ensure_today_overrides(data: dict) -> dict:
     return data["health_overrides"]
 
 
+@_mutation
 def update_todo_status(todo_id: int, done: bool):
     """更新待办完成状态。"""
-    data = load_user_data()
+    data = load_section("todos")
     data["todos"][str(todo_id)] = done
-    save_user_data(data)
+    save_section("todos", data)
 
 
-def add_expense(item: str, amount: float, category: str):
+@_mutation
+def add_expense(item: str, amount: float, category: str) -> Transaction:
     """新增一笔消费记录。"""
-    data = load_user_data()
-    record = {
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "item": item,
-        "amount": amount,
-        "category": category,
-        "icon": _category_icon(category),
-    }
-    data["extra_transactions"].insert(0, record)
-    save_user_data(data)
+    data = load_section("finance")
+    record = Transaction(datetime.now().strftime("%Y-%m-%d"), item, amount, category, _category_icon(category))
+    data["extra_transactions"].insert(0, record.to_dict())
+    save_section("finance", data)
     return record
 
 
+@_mutation
 def increment_water():
     """喝水 +1（跨天自动归零）。"""
-    data = load_user_data()
+    data = load_section("health")
     overrides = _ensure_today_overrides(data)
     overrides["water_cups"] = overrides.get("water_cups", 0) + 1
-    save_user_data(data)
+    save_section("health", data)
     return overrides["water_cups"]
 
 
+@_mutation
 def log_steps(steps: int):
     """记录今日步数（跨天自动归零）。"""
-    data = load_user_data()
+    data = load_section("health")
     overrides = _ensure_today_overrides(data)
     overrides["steps"] = steps
-    save_user_data(data)
+    save_section("health", data)
     return steps
 
 
+@_mutation
 def log_sleep(hours: float, quality: str = "一般"):
     """记录昨晚睡眠（跨天自动归零）。"""
-    data = load_user_data()
+    data = load_section("health")
     overrides = _ensure_today_overrides(data)
     overrides["sleep_hours"] = hours
     overrides["sleep_quality"] = quality
-    save_user_data(data)
+    save_section("health", data)
 
 
+@_mutation
 def log_exercise() -> bool:
     """运动打卡（当天只能打卡一次，周运动次数跨天累计、跨周自动重置）。返回是否为新打卡。"""
-    data = load_user_data()
+    data = load_section("health")
     overrides = _ensure_today_overrides(data)
     if overrides.get("exercise_today"):
         return False  # 今天已打卡，不重复计数
@@ -156,308 +593,564 @@ def log_exercise() -> bool:
     else:
         weekly["count"] = weekly.get("count", 0) + 1
 
-    save_user_data(data)
+    save_section("health", data)
     return True
 
 
+@_mutation
 def log_mood(mood: str):
     """心情记录（跨天自动归零）。"""
-    data = load_user_data()
+    data = load_section("health")
     overrides = _ensure_today_overrides(data)
     overrides["mood"] = mood
-    save_user_data(data)
+    save_section("health", data)
 
 
 def get_exercise_weekly() -> dict:
     """获取本周运动计数数据。"""
-    data = load_user_data()
-    return data.get("exercise_weekly", {"week_start": None, "count": 0})
+    return _read_copy("health", "exercise_weekly", {"week_start": None, "count": 0})
 
 
+@_mutation
 def set_exercise_goal(goal: int):
     """设置每周运动目标次数。"""
-    data = load_user_data()
+    data = load_section("settings")
     data["exercise_goal"] = goal
-    save_user_data(data)
+    save_section("settings", data)
 
 
 def get_exercise_goal():
     """获取每周运动目标次数，None 表示未设置（默认 3）。"""
-    data = load_user_data()
+    data = load_section("settings")
     return data.get("exercise_goal")
 
 
+@_mutation
 def update_packing(item: str, checked: bool):
     """更新旅行必带清单勾选状态。"""
-    data = load_user_data()
+    data = load_section("travel")
     packing = data.setdefault("packing_checked", [])
     if checked and item not in packing:
         packing.append(item)
     elif not checked and item in packing:
         packing.remove(item)
-    save_user_data(data)
+    save_section("travel", data)
+
+
+# ========== 写工具幂等键 ==========
+
+def get_idempotent_result(key: str) -> str | None:
+    """查询幂等键对应的已执行结果，未执行过返回 None。"""
+    data = load_section("idempotency")
+    return data.get("idempotency_keys", {}).get(key)
+
+
+@_mutation
+def remember_idempotency_key(key: str, result: str):
+    """记录写工具的幂等键及执行结果，超出上限时淘汰最早的键。"""
+    data = load_section("idempotency")
+    keys = data.setdefault("idempotency_keys", {})
+    keys.pop(key, None)
+    keys[key] = result
+    while len(keys) > MAX_IDEMPOTENCY_KEYS:
+        del keys[next(iter(keys))]
+    save_section("idempotency", data)
+
+
+# ========== 工具结果 Blob 存储（内容寻址）==========
+# 工具返回的整周课表、财务报告等在多轮对话间大量重复：正文按 sha256 只存一份（zlib 压缩），
+# 消息的 tool_log 里只保留 result_ref，界面展开时才按哈希取回正文。
+
+def put_tool_result(text: str) -> str:
+    """保存工具结果正文，返回其内容哈希；相同内容只写一次。"""
+    ref = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    path = BLOB_DIR / (ref + ".z")
+    try:
+        # 复用已有 blob：刷新修改时间，避免被并发的回收误删
+        os.utime(path)
+        return ref
+    except FileNotFoundError:
+        pass
+    BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    _replace_files([(path, zlib.compress(text.encode("utf-8")))])
+    return ref
+
+
+def get_tool_result(ref: str) -> str:
+    """按哈希取回工具结果正文；读取失败时返回占位文字（失败不缓存，之后可读时仍能取回）。"""
+    try:
+        return _read_tool_result(ref)
+    except (OSError, zlib.error):
+        return "（该工具记录已被清理）"
+
+
+@lru_cache(maxsize=256)
+def _read_tool_result(ref: str) -> str:
+    """读取并解压 blob（内容不可变，成功的结果可放心缓存；异常不会被 lru_cache 记住）。"""
+    with open(BLOB_DIR / (ref + ".z"), "rb") as f:
+        return zlib.decompress(f.read()).decode("utf-8")
+
+
+def tool_log_result(entry: dict) -> str:
+    """取出一条 tool_log 记录的结果正文，兼容旧版内联的 result 字段。"""
+    if "result_ref" in entry:
+        return get_tool_result(entry["result_ref"])
+    return entry.get("result", "")
 
 
-MAX_PERSISTED_MESSAGES = 50  # 持久化对话历史上限
+def compact_tool_log(tool_log: list[dict]) -> list[dict]:
+    """把 tool_log 中内联的 result 换成 blob 引用。"""
+    compacted = []
+    for entry in tool_log:
+        if "result" in entry:
+            ref = put_tool_result(str(entry["result"]))
+            entry = {k: v for k, v in entry.items() if k != "result"}
+            entry["result_ref"] = ref
+        compacted.append(entry)
+    return compacted
 
 
-def save_chat_history(messages: list[dict]):
-    """保存对话历史（限制最大条数，防止 JSON 文件膨胀）。"""
-    data = load_user_data()
-    data["chat_messages"] = messages[-MAX_PERSISTED_MESSAGES:]
-    save_user_data(data)
+# ========== 对话日志（追加写 + 偏移索引）==========
+# 对话历史不再放在 user_data.json 里：每轮只向 chat_log.jsonl 追加新消息，
+# 并在 chat_log.idx 中记录每条消息的字节偏移，加载最近 N 条时只读文件尾部。
 
+MAX_PERSISTED_MESSAGES = 50  # 持久化对话历史上限（压缩后保留的条数）
+CHAT_LOG_COMPACT_AT = MAX_PERSISTED_MESSAGES * 2  # 日志超过该条数时压缩为最近 MAX_PERSISTED_MESSAGES 条
 
-def load_chat_history() -> list[dict]:
-    """加载对话历史。"""
-    data = load_user_data()
-    return data.get("chat_messages", [])
+_OFFSET = struct.Struct("<Q")
+_chat_lock = threading.RLock()
+
+
+def _compact_message(msg: dict) -> dict:
+    if "tool_log" in msg:
+        return dict(msg, tool_log=compact_tool_log(msg["tool_log"]))
+    return msg
+
+
+def _encode_chat_record(msg: dict) -> bytes:
+    # 紧凑输出不含换行，一条消息恰好占一行
+    return serializer.dumps(msg, pretty=False) + b"\n"
+
+
+def _read_offsets(start: int, end: int) -> list[int]:
+    """读取第 [start, end) 条消息的偏移。"""
+    with open(CHAT_INDEX_FILE, "rb") as f:
+        f.seek(start * _OFFSET.size)
+        raw = f.read((end - start) * _OFFSET.size)
+    return [o for (o,) in _OFFSET.iter_unpack(raw)]
+
+
+def _chat_count() -> int:
+    try:
+        return CHAT_INDEX_FILE.stat().st_size // _OFFSET.size
+    except FileNotFoundError:
+        return 0
+
+
+def _chat_index_consistent() -> bool:
+    """索引与日志是否一致：条数对得上、最后一条偏移恰好指向日志的最后一行。"""
+    log_size = CHAT_LOG_FILE.stat().st_size
+    idx_size = CHAT_INDEX_FILE.stat().st_size
+    if idx_size % _OFFSET.size:
+        return False
+    count = idx_size // _OFFSET.size
+    if count == 0:
+        return log_size == 0
+    (last,) = _read_offsets(count - 1, count)
+    if last >= log_size:
+        return False
+    with open(CHAT_LOG_FILE, "rb") as f:
+        f.seek(last)
+        tail = f.read()
+    return tail.endswith(b"\n") and tail.count(b"\n") == 1 and (
+        last == 0 or _byte_before(last) == b"\n"
+    )
+
+
+def _byte_before(offset: int) -> bytes:
+    with open(CHAT_LOG_FILE, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1)
+
+
+def _rebuild_chat_index():
+    """按日志重建偏移索引；写入中断留下的半行会被截掉。"""
+    offsets = []
+    pos = 0
+    with open(CHAT_LOG_FILE, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offsets.append(pos)
+            pos += len(line)
+    with open(CHAT_LOG_FILE, "r+b") as f:
+        f.truncate(pos)
+    with open(CHAT_INDEX_FILE, "wb") as f:
+        f.write(b"".join(_OFFSET.pack(o) for o in offsets))
+
+
+def _write_chat_log(messages: list[dict]):
+    """
+    整体重写日志与索引（原子替换，用于迁移、压缩与清空），
+    随后清理不再被引用的工具结果 blob。
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    messages = [_compact_message(m) for m in messages]
+    records = [_encode_chat_record(m) for m in messages]
+    offsets = []
+    pos = 0
+    for rec in records:
+        offsets.append(pos)
+        pos += len(rec)
+    # 先替换日志再替换索引：中途崩溃时索引对不上，下次打开会按日志重建
+    _replace_files([
+        (CHAT_LOG_FILE, b"".join(records)),
+        (CHAT_INDEX_FILE, b"".join(_OFFSET.pack(o) for o in offsets)),
+    ])
+    _gc_tool_blobs(messages)
+
+
+def _gc_tool_blobs(messages: list[dict]):
+    """删除不再被对话日志引用的工具结果 blob。"""
+    if not BLOB_DIR.exists():
+        return
+    live = {
+        entry["result_ref"]
+        for m in messages
+        for entry in m.get("tool_log", ())
+        if "result_ref" in entry
+    }
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    for path in BLOB_DIR.glob("*.z"):
+        if path.stem in live:
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _ensure_chat_log():
+    """首次使用时创建日志（旧版 user_data.json 里的 chat_messages 由 v1 迁移转入），随后校验索引。"""
+    _ensure_schema()
+    if not CHAT_LOG_FILE.exists():
+        _write_chat_log([])
+        return
+    if not CHAT_INDEX_FILE.exists() or not _chat_index_consistent():
+        _rebuild_chat_index()
+
+
+def _read_chat_range(start: int, end: int) -> list[dict]:
+    """读取第 [start, end) 条消息：按索引定位字节区间，只解析这一段。"""
+    if start >= end:
+        return []
+    offsets = _read_offsets(start, end)
+    with open(CHAT_LOG_FILE, "rb") as f:
+        f.seek(offsets[0])
+        if end < _chat_count():
+            (stop,) = _read_offsets(end, end + 1)
+            raw = f.read(stop - offsets[0])
+        else:
+            raw = f.read()
+    return [serializer.loads(line) for line in raw.split(b"\n") if line]
+
+
+def load_chat_page(before: int | None = None, limit: int = 20) -> tuple[list[dict], int]:
+    """
+    分页加载对话历史：返回 [start, before) 区间内最多 limit 条消息及 start。
+    before 为 None 时从最新一条往前取；start == 0 说明已经到头。
+    """
+    with _chat_lock:
+        _ensure_chat_log()
+        count = _chat_count()
+        end = count if before is None else min(before, count)
+        start = max(0, end - limit)
+        return _read_chat_range(start, end), start
+
+
+def append_chat_messages(messages: list[dict]) -> int:
+    """
+    追加新消息到对话日志：只写新增的几行和对应偏移，不重写已有历史。
+    日志超过 CHAT_LOG_COMPACT_AT 条时压缩为最近 MAX_PERSISTED_MESSAGES 条，
+    返回压缩时从头部丢弃的条数，调用方据此修正已加载区间的下标。
+    """
+    if not messages:
+        return 0
+    with _chat_lock:
+        _ensure_chat_log()
+        pos = CHAT_LOG_FILE.stat().st_size
+        records = [_encode_chat_record(_compact_message(m)) for m in messages]
+        offsets = []
+        for rec in records:
+            offsets.append(pos)
+            pos += len(rec)
+        # 先写日志再写索引：索引里出现的偏移一定已经落在日志中
+        with open(CHAT_LOG_FILE, "ab") as f:
+            f.write(b"".join(records))
+        with open(CHAT_INDEX_FILE, "ab") as f:
+            f.write(b"".join(_OFFSET.pack(o) for o in offsets))
+        _commit_files([(None, CHAT_LOG_FILE), (None, CHAT_INDEX_FILE)])
+
+        count = _chat_count()
+        if count <= CHAT_LOG_COMPACT_AT:
+            return 0
+        dropped = count - MAX_PERSISTED_MESSAGES
+        _write_chat_log(_read_chat_range(dropped, count))
+        return dropped
 
 
 def clear_chat_history():
     """清空对话历史。"""
-    data = load_user_data()
-    data["chat_messages"] = []
-    save_user_data(data)
+    with _chat_lock:
+        _write_chat_log([])
 
 
 def get_todo_overrides() -> dict:
     """获取待办状态覆盖字典 {todo_id_str: bool}。"""
-    data = load_user_data()
-    return data.get("todos", {})
+    return _read_copy("todos", "todos", {})
 
 
-def get_extra_transactions() -> list[dict]:
+def get_extra_transactions() -> list[Transaction]:
     """获取用户新增的消费记录。"""
-    data = load_user_data()
-    return data.get("extra_transactions", [])
+    with _doc_lock:
+        data = load_section("finance")
+        return [Transaction.from_dict(t) for t in data.get("extra_transactions", [])]
 
 
 def get_health_overrides() -> dict:
     """获取健康数据覆盖。"""
-    data = load_user_data()
-    return data.get("health_overrides", {})
+    return _read_copy("health", "health_overrides", {})
 
 
 def get_packing_checked() -> list[str]:
     """获取旅行清单已勾选项。"""
-    data = load_user_data()
-    return data.get("packing_checked", [])
+    return _read_copy("travel", "packing_checked", [])
 
 
-def add_todo(task: str, deadline: str, priority: str = "🟢 普通", category: str = "生活") -> dict:
+@_mutation
+def add_todo(task: str, deadline: str, priority: str = "🟢 普通", category: str = "生活") -> Todo:
     """新增一个待办事项，自动分配递增 ID。"""
-    data = load_user_data()
+    data = load_section("todos")
     extra = data.setdefault("extra_todos", [])
     # ID 从 max(7, 已有 extra ID) + 1 开始，避免与 mock 数据冲突
     existing_ids = [t["id"] for t in extra] if extra else [7]
     new_id = max(max(existing_ids), 7) + 1
-    todo = {
-        "id": new_id,
-        "task": task,
-        "deadline": deadline,
-        "priority": priority,
-        "done": False,
-        "category": category,
-    }
-    extra.append(todo)
-    save_user_data(data)
+    todo = Todo(new_id, task, deadline, priority, False, category)
+    extra.append(todo.to_dict())
+    save_section("todos", data)
     return todo
 
 
-def get_extra_todos() -> list[dict]:
+@_mutation
+def get_extra_todos() -> list[Todo]:
     """获取用户通过 Agent 新增的待办事项（自动清理截止日期超过 7 天的过期项）。"""
-    data = load_user_data()
+    data = load_section("todos")
     extra = data.get("extra_todos", [])
     if not extra:
-        return extra
+        return []
     from datetime import timedelta
     today = datetime.now().date()
     cutoff = today - timedelta(days=7)
     filtered = [t for t in extra if datetime.strptime(t["deadline"], "%Y-%m-%d").date() >= cutoff]
     if len(filtered) < len(extra):
         data["extra_todos"] = filtered
-        save_user_data(data)
-    return filtered
+        save_section("todos", data)
+    return [Todo.from_dict(t) for t in filtered]
 
 
 # ========== 课表相关操作 ==========
 
+@_mutation
 def add_course(weekday: str, time: str, course: str, location: str,
-               teacher: str = "", course_type: str = "选修") -> dict:
+               teacher: str = "", course_type: str = "选修") -> Course:
     """新增一门课程，自动分配递增 ID（从 101 开始，避免与 mock 1~10 冲突）。"""
-    data = load_user_data()
+    data = load_section("courses")
     extra = data.setdefault("extra_courses", [])
     existing_ids = [c["id"] for c in extra] if extra else [100]
     new_id = max(max(existing_ids), 100) + 1
-    record = {
-        "id": new_id,
-        "weekday": weekday,
-        "time": time,
-        "course": course,
-        "location": location,
-        "teacher": teacher,
-        "type": course_type,
-    }
-    extra.append(record)
-    save_user_data(data)
+    record = Course(new_id, weekday, time, course, location, teacher, course_type)
+    extra.append(record.to_dict())
+    save_section("courses", data)
     return record
 
 
+@_mutation
 def delete_course(course_id: int) -> bool:
     """删除课程。如果是用户新增课程则直接移除，如果是 mock 课程则标记删除。"""
-    data = load_user_data()
+    data = load_section("courses")
     # 先检查是否在 extra_courses 中
     extra = data.setdefault("extra_courses", [])
     for i, c in enumerate(extra):
         if c["id"] == course_id:
             extra.pop(i)
-            save_user_data(data)
+            save_section("courses", data)
             return True
     # 否则标记删除 mock 课程
     deleted = data.setdefault("deleted_course_ids", [])
     if course_id not in deleted:
         deleted.append(course_id)
-        save_user_data(data)
+        save_section("courses", data)
     return True
 
 
+@_mutation
 def update_course(course_id: int, **fields) -> dict:
     """修改课程字段。对 extra_courses 直接修改，对 mock 课程记录 overlay。"""
-    data = load_user_data()
+    data = load_section("courses")
     # 先检查是否在 extra_courses 中
     extra = data.setdefault("extra_courses", [])
     for c in extra:
         if c["id"] == course_id:
             for k, v in fields.items():
                 c[k] = v
-            save_user_data(data)
-            return c
+            save_section("courses", data)
+            return dict(c)
     # 否则记录为 mock 课程的修改 overlay
     updates = data.setdefault("course_updates", {})
     cid_str = str(course_id)
     updates.setdefault(cid_str, {}).update(fields)
-    save_user_data(data)
-    return updates[cid_str]
+    save_section("courses", data)
+    return dict(updates[cid_str])
 
 
-def get_extra_courses() -> list[dict]:
+def get_extra_courses() -> list[Course]:
     """获取用户新增的课程列表。"""
-    data = load_user_data()
-    return data.get("extra_courses", [])
+    with _doc_lock:
+        data = load_section("courses")
+        return [Course.from_dict(c) for c in data.get("extra_courses", [])]
 
 
 def get_deleted_course_ids() -> list[int]:
     """获取已删除的 mock 课程 ID 列表。"""
-    data = load_user_data()
-    return data.get("deleted_course_ids", [])
+    return _read_copy("courses", "deleted_course_ids", [])
 
 
 def get_course_updates() -> dict:
     """获取课程修改记录 {course_id_str: {field: value}}。"""
-    data = load_user_data()
-    return data.get("course_updates", {})
+    return _read_copy("courses", "course_updates", {})
 
 
 # ========== 预算相关操作 ==========
 
+@_mutation
 def set_budget(amount: float):
     """设置月预算金额。"""
-    data = load_user_data()
+    data = load_section("settings")
     data["monthly_budget"] = amount
-    save_user_data(data)
+    save_section("settings", data)
 
 
 def get_budget() -> float | None:
     """获取月预算金额，None 表示未设置。"""
-    data = load_user_data()
+    data = load_section("settings")
     return data.get("monthly_budget")
 
 
 # ========== 旅行计划相关操作 ==========
 
+@_mutation
 def update_travel(**fields):
     """修改旅行计划顶层字段（trip_name/date/budget/status/companions）。"""
-    data = load_user_data()
+    if isinstance(fields.get("companions"), str):
+        fields["companions"] = _split_companions(fields["companions"])
+    data = load_section("travel")
     overrides = data.setdefault("travel_overrides", {})
     overrides.update(fields)
-    save_user_data(data)
+    save_section("travel", data)
 
 
 def get_travel_overrides() -> dict:
     """获取旅行计划顶层字段覆盖。"""
-    data = load_user_data()
-    return data.get("travel_overrides", {})
+    return _read_copy("travel", "travel_overrides", {})
 
 
+@_mutation
 def add_itinerary_item(time: str, activity: str, location: str,
-                       cost: float = 0, icon: str = "📍") -> dict:
+                       cost: float = 0, icon: str = "📍") -> ItineraryStop:
     """新增一个行程站点。"""
-    data = load_user_data()
+    data = load_section("travel")
     extra = data.setdefault("extra_itinerary", [])
-    item = {
-        "time": time,
-        "activity": activity,
-        "location": location,
-        "cost": cost,
-        "icon": icon,
-    }
-    extra.append(item)
-    save_user_data(data)
+    item = ItineraryStop(time, activity, location, cost, icon)
+    extra.append(item.to_dict())
+    save_section("travel", data)
     return item
 
 
+@_mutation
 def delete_itinerary_item(index: int):
     """删除一个行程站点（索引从 0 开始，指 mock 行程列表的索引）。"""
-    data = load_user_data()
+    data = load_section("travel")
     deleted = data.setdefault("deleted_itinerary_idxs", [])
     if index not in deleted:
         deleted.append(index)
-    save_user_data(data)
+    save_section("travel", data)
 
 
+@_mutation
 def update_itinerary_item(index: int, **fields):
     """修改一个行程站点的字段。"""
-    data = load_user_data()
+    data = load_section("travel")
     updates = data.setdefault("itinerary_updates", {})
     idx_str = str(index)
     updates.setdefault(idx_str, {}).update(fields)
-    save_user_data(data)
+    save_section("travel", data)
+
+
+@_mutation
+def delete_extra_itinerary_item(index: int):
+    """删除一个用户新增的行程站点（索引指 extra_itinerary 列表）。"""
+    data = load_section("travel")
+    extra = data.get("extra_itinerary", [])
+    if 0 <= index < len(extra):
+        extra.pop(index)
+        save_section("travel", data)
+
+
+@_mutation
+def update_extra_itinerary_item(index: int, **fields):
+    """修改一个用户新增的行程站点（索引指 extra_itinerary 列表）。"""
+    data = load_section("travel")
+    extra = data.get("extra_itinerary", [])
+    if 0 <= index < len(extra):
+        extra[index].update(fields)
+        save_section("travel", data)
 
 
-def get_extra_itinerary() -> list[dict]:
+def get_extra_itinerary() -> list[ItineraryStop]:
     """获取用户新增的行程站点列表。"""
-    data = load_user_data()
-    return data.get("extra_itinerary", [])
+    with _doc_lock:
+        data = load_section("travel")
+        return [ItineraryStop.from_dict(s) for s in data.get("extra_itinerary", [])]
 
 
 def get_deleted_itinerary_idxs() -> list[int]:
     """获取已删除的行程站点索引列表。"""
-    data = load_user_data()
-    return data.get("deleted_itinerary_idxs", [])
+    return _read_copy("travel", "deleted_itinerary_idxs", [])
 
 
 def get_itinerary_updates() -> dict:
     """获取行程站点修改记录 {idx_str: {field: value}}。"""
-    data = load_user_data()
-    return data.get("itinerary_updates", {})
+    return _read_copy("travel", "itinerary_updates", {})
 
 
+@_mutation
 def delete_travel_plan():
     """标记整个旅行计划为已删除。"""
-    data = load_user_data()
+    data = load_section("travel")
     overrides = data.setdefault("travel_overrides", {})
     overrides["deleted"] = True
-    save_user_data(data)
+    save_section("travel", data)
 
 
+@_mutation
 def reset_travel_itinerary():
     """重置行程数据（清空所有行程修改，用于创建全新旅行计划）。"""
-    data = load_user_data()
+    data = load_section("travel")
     data["extra_itinerary"] = []
     data["deleted_itinerary_idxs"] = list(range(8))  # 删除全部 mock 行程
     data["itinerary_updates"] = {}
-    save_user_data(data)
+    save_section("travel", data)
 
 
 def _category_icon(category: str) -> str:
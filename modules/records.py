@@ -0,0 +1,160 @@
+"""
+UniLife OS — 实体记录类型
+课程、消费、待办、行程站点在内存中统一用不可变的 __slots__ dataclass 表示（无实例 __dict__，属性访问更快、占用更小；
+不可变，因此 mock 基础数据可以在模块级只构造一次、被所有调用方共享），
+星期 / 消费类别 / 待办分类 / 优先级用 str 混入枚举：同一取值全进程共享一个对象，
+与普通字符串比较、拼接、格式化、JSON 序列化的行为完全一致。
+持久化层仍以普通 dict 存储，读写分片时经 from_dict / to_dict 转换。
+"""
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, fields, replace
+from enum import Enum
+
+
+# ========== 枚举 ==========
+
+class _StrEnum(str, Enum):
+    """str 混入枚举：str() / format() 都返回取值本身，与普通字符串无差别。"""
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+class Weekday(_StrEnum):
+    MON = "周一"
+    TUE = "周二"
+    WED = "周三"
+    THU = "周四"
+    FRI = "周五"
+    SAT = "周六"
+    SUN = "周日"
+
+    @classmethod
+    def from_index(cls, index: int) -> Weekday:
+        """datetime.weekday() 的 0~6 → 周一~周日。"""
+        return _WEEKDAYS[index]
+
+
+_WEEKDAYS = tuple(Weekday)
+
+
+class ExpenseCategory(_StrEnum):
+    FOOD = "餐饮"
+    TRANSPORT = "交通"
+    SHOPPING = "购物"
+    STUDY = "学习用品"
+    ENTERTAINMENT = "娱乐"
+    OTHER = "其他"
+
+
+class TodoCategory(_StrEnum):
+    STUDY = "学业"
+    LIFE = "生活"
+    SOCIAL = "社交"
+
+
+class Priority(_StrEnum):
+    URGENT = "🔴 紧急"
+    IMPORTANT = "🟡 重要"
+    NORMAL = "🟢 普通"
+
+
+def _member(enum_cls: type[_StrEnum], value):
+    """取值对应的枚举成员；不在枚举内的值（如 LLM 自拟的类别）原样保留为驻留字符串。"""
+    member = enum_cls._value2member_map_.get(value)
+    if member is not None:
+        return member
+    return _intern(value)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+_set = object.__setattr__  # frozen dataclass 的 __post_init__ 里规范化字段取值
+
+
+def _plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+# ========== 记录类型 ==========
+
+class _Record:
+    """记录类型的公共方法（子类为 frozen slots dataclass，修改一律经 updated 生成新记录）。"""
+    __slots__ = ()
+    _FIELDS: tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """从持久化 dict 构造（忽略未知 key）。"""
+        return cls(**{k: data[k] for k in cls._FIELDS if k in data})
+
+    def to_dict(self) -> dict:
+        """转换为可直接序列化的普通 dict（枚举成员还原为字符串）。"""
+        return {k: _plain(getattr(self, k)) for k in self._FIELDS}
+
+    def updated(self, changes: dict):
+        """返回应用了字段修改的新记录（忽略未知字段）。"""
+        return replace(self, **{k: v for k, v in changes.items() if k in self._FIELDS})
+
+
+def _record(cls):
+    cls = dataclass(frozen=True, slots=True)(cls)
+    cls._FIELDS = tuple(f.name for f in fields(cls))
+    return cls
+
+
+@_record
+class Course(_Record):
+    id: int
+    weekday: Weekday | str
+    time: str
+    course: str
+    location: str
+    teacher: str = ""
+    type: str = "选修"
+
+    def __post_init__(self):
+        _set(self, "weekday", _member(Weekday, self.weekday))
+        _set(self, "type", _intern(self.type))
+
+
+@_record
+class Transaction(_Record):
+    date: str
+    item: str
+    amount: float
+    category: ExpenseCategory | str = ExpenseCategory.OTHER
+    icon: str = "💳"
+
+    def __post_init__(self):
+        _set(self, "category", _member(ExpenseCategory, self.category))
+        _set(self, "icon", _intern(self.icon))
+
+
+@_record
+class Todo(_Record):
+    id: int
+    task: str
+    deadline: str
+    priority: Priority | str = Priority.NORMAL
+    done: bool = False
+    category: TodoCategory | str = TodoCategory.LIFE
+
+    def __post_init__(self):
+        _set(self, "priority", _member(Priority, self.priority))
+        _set(self, "category", _member(TodoCategory, self.category))
+
+
+@_record
+class ItineraryStop(_Record):
+    time: str
+    activity: str
+    location: str
+    cost: float = 0
+    icon: str = "📍"
+
+    def __post_init__(self):
+        _set(self, "icon", _intern(self.icon))
@@ -0,0 +1,176 @@
+"""
+UniLife OS — 课表索引
+按课表数据版本构建一次：ID → 课程、星期 → 按开始时间排序的课程、(星期, 时间段) → 课程、
+星期 → 区间索引（时间段在构建时解析为分钟区间），
+课表工具、今日课程、时间冲突检查与空闲时段计算直接查表，不再每次线性扫描整张课表。
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from types import MappingProxyType
+from typing import Generic, Iterable, Mapping, TypeVar
+
+from modules.records import Course, Weekday
+
+T = TypeVar("T")
+
+_CLOCK = re.compile(r"(\d{1,2})[:：](\d{2})")
+_RANGE = re.compile(r"(\d{1,2})[:：](\d{2})(?:\s*[-~～－—至到]+\s*(\d{1,2})[:：](\d{2}))?")
+
+
+def start_minutes(time_range: str) -> int:
+    """时间段的开始时刻（距 0 点的分钟数），用于排序；无法解析时排在最后。"""
+    m = _CLOCK.search(time_range)
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else 24 * 60
+
+
+def parse_interval(time_range: str) -> tuple[int, int] | None:
+    """
+    「HH:MM-HH:MM」→ (开始, 结束) 分钟数；单个时刻「HH:MM」→ (t, t)。
+    格式不对、时刻越界或结束不晚于开始时返回 None。
+    """
+    m = _RANGE.fullmatch(str(time_range).strip())
+    if not m:
+        return None
+    h1, m1, h2, m2 = m.groups()
+    start = int(h1) * 60 + int(m1)
+    if int(h1) > 23 or int(m1) > 59:
+        return None
+    if h2 is None:
+        return start, start
+    end = int(h2) * 60 + int(m2)
+    if int(m2) > 59 or end > 24 * 60 or end <= start:
+        return None
+    return start, end
+
+
+def format_clock(minutes: int) -> str:
+    """分钟数 → 「HH:MM」。"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class IntervalIndex(Generic[T]):
+    """
+    静态区间索引：区间按开始时刻排序，并记录前缀最大结束时刻（数组形式的增广区间树）。
+    重叠查询先二分定位「开始早于查询结束」的区间，再自右向左扫描，前缀最大结束时刻不晚于查询开始即可停止，
+    课表、行程这类基本不互相嵌套的区间耗时为 O(log n + 命中数)。
+    区间为左闭右开；单个时刻 (t, t) 只与严格包含它的区间重叠（「09:30 到达」与「09:30-12:00 游玩」不冲突）。
+    """
+
+    __slots__ = ("_starts", "_ends", "_max_end", "_items")
+
+    def __init__(self, entries: Iterable[tuple[tuple[int, int], T]]):
+        entries = sorted(entries, key=lambda e: e[0])
+        self._starts = [start for (start, _), _ in entries]
+        self._ends = [end for (_, end), _ in entries]
+        self._items = [item for _, item in entries]
+        self._max_end = []
+        running = -1
+        for end in self._ends:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    def overlapping(self, start: int, end: int) -> list[T]:
+        """与 [start, end) 重叠的条目，按开始时刻排序。"""
+        hits = []
+        i = bisect_left(self._starts, end)
+        while i > 0:
+            i -= 1
+            if self._max_end[i] <= start:
+                break
+            if start < self._ends[i]:
+                hits.append(self._items[i])
+        hits.reverse()
+        return hits
+
+    def gaps(self, lo: int, hi: int, min_length: int = 1) -> list[tuple[int, int]]:
+        """
+        [lo, hi) 内不被任何区间覆盖、且不短于 min_length 分钟的空档。
+        区间已按开始时刻排序，一次顺序扫描即完成合并，O(n)；单个时刻不占用时段。
+        """
+        free = []
+        cursor = lo
+        for start, end in zip(self._starts, self._ends):
+            if start >= hi:
+                break
+            if end <= cursor or start == end:
+                continue
+            if start - cursor >= min_length:
+                free.append((cursor, start))
+            cursor = end
+        if hi - cursor >= min_length:
+            free.append((cursor, hi))
+        return free
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ScheduleIndex:
+    """课表的只读索引（构建后不再修改，可在会话间共享）。"""
+
+    __slots__ = ("courses", "_by_id", "_by_weekday", "_by_slot", "_intervals")
+
+    def __init__(self, courses: Iterable[Course]):
+        self.courses: tuple[Course, ...] = tuple(courses)
+        by_id: dict[int, Course] = {}
+        by_weekday: dict[str, list[Course]] = {}
+        by_slot: dict[tuple[str, str], list[Course]] = {}
+        intervals: dict[str, list[tuple[tuple[int, int], Course]]] = {}
+        for c in self.courses:
+            by_id[c.id] = c
+            by_weekday.setdefault(c.weekday, []).append(c)
+            by_slot.setdefault((c.weekday, c.time), []).append(c)
+            interval = parse_interval(c.time)
+            if interval is not None:
+                intervals.setdefault(c.weekday, []).append((interval, c))
+        self._by_id: Mapping[int, Course] = MappingProxyType(by_id)
+        self._by_weekday: Mapping[str, tuple[Course, ...]] = MappingProxyType({
+            wd: tuple(sorted(cs, key=lambda c: start_minutes(c.time)))
+            for wd, cs in by_weekday.items()
+        })
+        self._by_slot: Mapping[tuple[str, str], tuple[Course, ...]] = MappingProxyType(
+            {slot: tuple(cs) for slot, cs in by_slot.items()}
+        )
+        self._intervals: Mapping[str, IntervalIndex[Course]] = MappingProxyType(
+            {wd: IntervalIndex(entries) for wd, entries in intervals.items()}
+        )
+
+    def get(self, course_id: int) -> Course | None:
+        """按 ID 查课程。"""
+        return self._by_id.get(course_id)
+
+    def on(self, weekday: str) -> tuple[Course, ...]:
+        """某一天的课程，按开始时间排序。"""
+        return self._by_weekday.get(weekday, ())
+
+    def at(self, weekday: str, time: str) -> tuple[Course, ...]:
+        """占用同一星期、同一时间段的课程。"""
+        return self._by_slot.get((weekday, time), ())
+
+    def conflicts(self, weekday: str, start: int, end: int, exclude: int | None = None) -> list[Course]:
+        """
+        与某天 [start, end) 分钟区间重叠的课程（exclude 为修改中的课程自身 ID）。
+        单个时刻按该分钟查询：「14:00」落在 14:00-15:35 的课内。
+        """
+        intervals = self._intervals.get(weekday)
+        if intervals is None:
+            return []
+        if end <= start:
+            end = start + 1
+        return [c for c in intervals.overlapping(start, end) if c.id != exclude]
+
+    def free_slots(self, weekday: str, lo: int, hi: int, min_length: int = 1) -> list[tuple[int, int]]:
+        """某天 [lo, hi) 分钟范围内没有课、且不短于 min_length 分钟的空闲时段。"""
+        intervals = self._intervals.get(weekday)
+        if intervals is None:
+            return [(lo, hi)] if hi - lo >= min_length else []
+        return intervals.gaps(lo, hi, min_length)
+
+    def by_weekday(self) -> list[tuple[Weekday, tuple[Course, ...]]]:
+        """按周一到周日顺序列出有课的日子及当天课程。"""
+        return [(wd, self._by_weekday[wd]) for wd in Weekday if wd in self._by_weekday]
+
+    def __len__(self) -> int:
+        return len(self.courses)
@@ -0,0 +1,85 @@
+"""
+UniLife OS — JSON 序列化后端
+按可用性依次选用 orjson → msgspec → 标准库 json（可用 PERSIST_JSON_BACKEND 强制指定），
+统一以 UTF-8 bytes 输入输出。默认紧凑输出；PERSIST_PRETTY_JSON=1 时缩进 2 格，便于手工查看数据文件。
+"""
+from __future__ import annotations
+
+import json
+from typing import Callable
+
+from config import PERSIST_JSON_BACKEND, PERSIST_PRETTY_JSON
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # 可选依赖
+    msgspec = None
+
+
+# ========== 各后端实现 ==========
+
+def _orjson_dumps(obj, pretty: bool) -> bytes:
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, option=option)
+
+
+def _msgspec_dumps(obj, pretty: bool) -> bytes:
+    raw = _msgspec_encoder.encode(obj)
+    return msgspec.json.format(raw, indent=2) if pretty else raw
+
+
+def _json_dumps(obj, pretty: bool) -> bytes:
+    if pretty:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+_BACKENDS: dict[str, tuple[Callable, Callable]] = {}
+if orjson is not None:
+    _BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _BACKENDS["msgspec"] = (_msgspec_dumps, msgspec.json.Decoder().decode)
+_BACKENDS["json"] = (_json_dumps, json.loads)
+
+
+def available_backends() -> list[str]:
+    """当前环境可用的后端，按优先级排列。"""
+    return list(_BACKENDS)
+
+
+def get_backend(name: str) -> tuple[Callable, Callable]:
+    """返回指定后端的 (dumps, loads)，供基准测试对比使用。"""
+    if name not in _BACKENDS:
+        raise ValueError(f"JSON 后端 {name} 不可用（可用：{', '.join(_BACKENDS)}）")
+    return _BACKENDS[name]
+
+
+# 各后端解析失败时抛出的异常（json / orjson 为 ValueError 子类，msgspec 自成一类）
+DecodeError: tuple[type[Exception], ...] = (ValueError,)
+if msgspec is not None:
+    DecodeError += (msgspec.DecodeError,)
+
+BACKEND = PERSIST_JSON_BACKEND or available_backends()[0]
+_dumps, _loads = get_backend(BACKEND)
+
+
+# ========== 对外接口 ==========
+
+def dumps(obj, pretty: bool | None = None) -> bytes:
+    """序列化为 UTF-8 bytes；pretty 为 None 时按 PERSIST_PRETTY_JSON 配置。紧凑输出保证不含换行。"""
+    return _dumps(obj, PERSIST_PRETTY_JSON if pretty is None else pretty)
+
+
+def loads(data: bytes | str):
+    """从 bytes / str 反序列化。"""
+    return _loads(data)
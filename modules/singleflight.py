@@ -0,0 +1,51 @@
+"""
+UniLife OS — Singleflight 请求合并
+相同 key 的并发请求只真正执行一次，其余调用方等待并共享同一个在途 Future 的结果。
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按 key 合并并发中的相同请求（不做结果缓存，请求结束即失效）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future] = {}
+        self._coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """执行 fn；若同 key 的请求正在进行，则直接等待其结果（异常同样共享）。"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._coalesced += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        """合并计数：coalesced 为被合并（未实际执行）的请求数，in_flight 为当前在途 key 数。"""
+        with self._lock:
+            return {"coalesced": self._coalesced, "in_flight": len(self._in_flight)}
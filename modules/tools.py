@@ -5,10 +5,15 @@ UniLife OS — Agent 工具定义
 from __future__ import annotations
 
 import json
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from modules.singleflight import SingleFlight
+from modules.records import Course, Weekday
+from modules.fuzzy import NgramIndex
+from modules.schedule_index import format_clock, parse_interval
 from modules.mock_data import (
-    get_schedule, get_today_schedule, get_finance, get_health,
-    get_todos, get_upcoming_exams, get_travel_plan,
+    get_schedule_index, get_today_schedule, get_finance, get_health,
+    get_todos, get_upcoming_exams, get_travel_plan, get_itinerary_index,
 )
 from modules.persistence import (
     add_expense, update_todo_status,
@@ -23,8 +28,11 @@ from modules.persistence import (
     add_itinerary_item as persist_add_itinerary,
     delete_itinerary_item as persist_delete_itinerary,
     update_itinerary_item as persist_update_itinerary,
+    delete_extra_itinerary_item, update_extra_itinerary_item,
     delete_travel_plan as persist_delete_travel,
     reset_travel_itinerary as persist_reset_itinerary,
+    get_idempotent_result, remember_idempotency_key,
+    user_data_snapshot,
 )
 
 # ========== 工具 Schema（OpenAI function calling 格式）==========
@@ -34,7 +42,7 @@ TOOL_SCHEMAS = [
         "type": "function",
         "function": {
             "name": "query_schedule",
-            "description": "查询课表。可以指定星期几查询，也可以不指定查询整周课表。",
+            "description": "查询课表。可以指定星期几查询，也可以不指定查询整周课表；可按课程名、教师或教室查找某门课。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -42,6 +50,83 @@ TOOL_SCHEMAS = [
                         "type": "string",
                         "description": "星期几，如 '周一'、'周二'。不传则查询整周。",
                         "enum": ["周一", "周二", "周三", "周四", "周五", "周六", "周日"],
+                    },
+                    "keyword": {
+                        "type": "string",
+                        "description": "课程名、教师或教室（支持简称与错别字），如 '高数'、'张老师'、'A-301'。不传则列出全部课程。",
+                    },
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_time_slot",
+            "description": "检查某天某个时刻或时间段有没有课。用户问'周三下午两点有空吗'、'周五 10:00-12:00 有课吗'时调用，只返回冲突的课程，无需查询整周课表。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "weekday": {
+                        "type": "string",
+                        "description": "星期几",
+                        "enum": ["周一", "周二", "周三", "周四", "周五", "周六", "周日"],
+                    },
+                    "time": {
+                        "type": "string",
+                        "description": "时刻或时间段，如 '14:00' 或 '14:00-16:00'",
+                    },
+                },
+                "required": ["weekday", "time"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_free_slots",
+            "description": "查找未来 7 天（或指定星期）没有课的空闲时段，并标注当天的考试和待办截止。用户问'这周什么时候有空复习'、'周四下午有没有两小时的空档'时调用，直接返回空闲时段，无需自己根据课表推算。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "weekday": {
+                        "type": "string",
+                        "description": "只看某一天（未来 7 天内的该星期几）。不传则查未来 7 天。",
+                        "enum": ["周一", "周二", "周三", "周四", "周五", "周六", "周日"],
+                    },
+                    "min_minutes": {
+                        "type": "integer",
+                        "description": "空闲时段的最短时长（分钟），默认 60",
+                    },
+                    "start": {
+                        "type": "string",
+                        "description": "每天从几点开始算，默认 '08:00'",
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "每天到几点为止，默认 '22:00'",
+                    },
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "query_overview",
+            "description": "一次性查询多个模块的精简概览（今日课程、待办、考试、健康、财务、旅行）。用户问'今天怎么样'、'我最近情况如何'这类综合问题时优先调用，代替逐个调用多个查询工具。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sections": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "enum": ["schedule", "todos", "exams", "health", "finance", "travel"],
+                        },
+                        "description": "需要的模块，不传则返回课程、待办、考试、健康、财务五项。",
                     }
                 },
                 "required": [],
@@ -154,10 +239,15 @@ TOOL_SCHEMAS = [
         "type": "function",
         "function": {
             "name": "query_travel",
-            "description": "查询旅行计划，包括行程、预算和必带清单。",
+            "description": "查询旅行计划，包括行程、预算和必带清单；可按活动或地点查找某一站。",
             "parameters": {
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "keyword": {
+                        "type": "string",
+                        "description": "活动名称或地点（支持简称），只列出匹配的站点，如 '博物馆'。不传则列出全部行程。",
+                    },
+                },
                 "required": [],
             },
         },
@@ -328,6 +418,10 @@ TOOL_SCHEMAS = [
                         "description": "课程类型，默认'选修'",
                         "enum": ["必修", "选修", "实验"],
                     },
+                    "allow_conflict": {
+                        "type": "boolean",
+                        "description": "与已有课程时间重叠时仍然添加（仅在用户确认后设为 true）",
+                    },
                 },
                 "required": ["weekday", "time", "course", "location"],
             },
@@ -396,6 +490,10 @@ TOOL_SCHEMAS = [
                         "description": "新的课程类型",
                         "enum": ["必修", "选修", "实验"],
                     },
+                    "allow_conflict": {
+                        "type": "boolean",
+                        "description": "改后与其他课程时间重叠时仍然修改（仅在用户确认后设为 true）",
+                    },
                 },
                 "required": [],
             },
@@ -584,6 +682,9 @@ TOOL_SCHEMAS = [
 # 工具名到中文描述的映射（用于 UI 展示）
 TOOL_DISPLAY_NAMES = {
     "query_schedule": "查询课表",
+    "check_time_slot": "检查时间段",
+    "find_free_slots": "查找空闲时段",
+    "query_overview": "查询今日概览",
     "query_finance": "查询财务数据",
     "record_expense": "记录消费",
     "query_health": "查询健康数据",
@@ -612,81 +713,136 @@ TOOL_DISPLAY_NAMES = {
 
 # ========== 工具执行路由 ==========
 
-def execute_tool(name: str, args: dict) -> str:
+# 只读工具：不修改任何持久化数据，无需幂等键
+READ_ONLY_TOOLS = frozenset({
+    "query_schedule", "query_overview", "query_finance", "query_health", "query_todos",
+    "query_exams", "query_travel", "check_time_slot", "find_free_slots",
+})
+
+# 串行化「查幂等键 → 执行 → 记录幂等键」，防止并发重放同时穿透
+_idempotency_lock = threading.Lock()
+
+# 并发中的相同只读查询只执行一次
+_tool_flight = SingleFlight()
+
+
+def get_tool_coalesce_stats() -> dict:
+    """获取只读工具请求合并计数。"""
+    return _tool_flight.stats()
+
+
+def execute_tool(name: str, args: dict, idempotency_key: str | None = None) -> str:
     """
     执行指定工具，返回结果字符串。
     args 已经是 dict（由 JSON 解析后传入）。
+    idempotency_key: 写工具的幂等键，同一个键重复执行时直接返回首次结果，不再修改数据。
     """
+    if idempotency_key and name not in READ_ONLY_TOOLS:
+        with _idempotency_lock:
+            cached = get_idempotent_result(idempotency_key)
+            if cached is not None:
+                return cached
+            try:
+                result = _dispatch_tool(name, args)
+            except Exception as e:
+                return f"工具执行出错: {str(e)}"  # 出错不记录，允许重试
+            remember_idempotency_key(idempotency_key, result)
+            return result
     try:
-        if name == "query_schedule":
-            return _exec_query_schedule(args)
-        elif name == "query_finance":
-            return _exec_query_finance(args)
-        elif name == "record_expense":
-            return _exec_record_expense(args)
-        elif name == "query_health":
-            return _exec_query_health(args)
-        elif name == "query_todos":
-            return _exec_query_todos(args)
-        elif name == "toggle_todo":
-            return _exec_toggle_todo(args)
-        elif name == "query_exams":
-            return _exec_query_exams(args)
-        elif name == "query_travel":
-            return _exec_query_travel(args)
-        elif name == "record_water":
-            return _exec_record_water(args)
-        elif name == "record_exercise":
-            return _exec_record_exercise(args)
-        elif name == "record_mood":
-            return _exec_record_mood(args)
-        elif name == "update_packing":
-            return _exec_update_packing(args)
-        elif name == "add_todo":
-            return _exec_add_todo(args)
-        elif name == "record_steps":
-            return _exec_record_steps(args)
-        elif name == "record_sleep":
-            return _exec_record_sleep(args)
-        elif name == "add_course":
-            return _exec_add_course(args)
-        elif name == "delete_course":
-            return _exec_delete_course(args)
-        elif name == "update_course":
-            return _exec_update_course(args)
-        elif name == "set_budget":
-            return _exec_set_budget(args)
-        elif name == "set_exercise_goal":
-            return _exec_set_exercise_goal(args)
-        elif name == "update_travel":
-            return _exec_update_travel(args)
-        elif name == "add_itinerary_stop":
-            return _exec_add_itinerary_stop(args)
-        elif name == "delete_itinerary_stop":
-            return _exec_delete_itinerary_stop(args)
-        elif name == "update_itinerary_stop":
-            return _exec_update_itinerary_stop(args)
-        else:
-            return f"未知工具: {name}"
+        if name in READ_ONLY_TOOLS:
+            key = name + ":" + json.dumps(args, ensure_ascii=False, sort_keys=True)
+            return _tool_flight.do(key, lambda: _dispatch_tool(name, args))
+        return _dispatch_tool(name, args)
     except Exception as e:
         return f"工具执行出错: {str(e)}"
 
 
+def _dispatch_tool(name: str, args: dict) -> str:
+    """按工具名路由到具体执行函数，异常由调用方统一处理。"""
+    if name == "query_schedule":
+        return _exec_query_schedule(args)
+    elif name == "check_time_slot":
+        return _exec_check_time_slot(args)
+    elif name == "find_free_slots":
+        return _exec_find_free_slots(args)
+    elif name == "query_overview":
+        return _exec_query_overview(args)
+    elif name == "query_finance":
+        return _exec_query_finance(args)
+    elif name == "record_expense":
+        return _exec_record_expense(args)
+    elif name == "query_health":
+        return _exec_query_health(args)
+    elif name == "query_todos":
+        return _exec_query_todos(args)
+    elif name == "toggle_todo":
+        return _exec_toggle_todo(args)
+    elif name == "query_exams":
+        return _exec_query_exams(args)
+    elif name == "query_travel":
+        return _exec_query_travel(args)
+    elif name == "record_water":
+        return _exec_record_water(args)
+    elif name == "record_exercise":
+        return _exec_record_exercise(args)
+    elif name == "record_mood":
+        return _exec_record_mood(args)
+    elif name == "update_packing":
+        return _exec_update_packing(args)
+    elif name == "add_todo":
+        return _exec_add_todo(args)
+    elif name == "record_steps":
+        return _exec_record_steps(args)
+    elif name == "record_sleep":
+        return _exec_record_sleep(args)
+    elif name == "add_course":
+        return _exec_add_course(args)
+    elif name == "delete_course":
+        return _exec_delete_course(args)
+    elif name == "update_course":
+        return _exec_update_course(args)
+    elif name == "set_budget":
+        return _exec_set_budget(args)
+    elif name == "set_exercise_goal":
+        return _exec_set_exercise_goal(args)
+    elif name == "update_travel":
+        return _exec_update_travel(args)
+    elif name == "add_itinerary_stop":
+        return _exec_add_itinerary_stop(args)
+    elif name == "delete_itinerary_stop":
+        return _exec_delete_itinerary_stop(args)
+    elif name == "update_itinerary_stop":
+        return _exec_update_itinerary_stop(args)
+    else:
+        return f"未知工具: {name}"
+
+
 # ========== 各工具的具体执行逻辑 ==========
 
-def _format_course_line(c: dict) -> str:
+def _format_course_line(c: Course) -> str:
     """格式化单条课程信息，跳过空字段。"""
-    parts = [c["location"]]
-    if c.get("teacher"):
-        parts.append(c["teacher"])
-    parts.append(c["type"])
-    return f"- {c['time']} {c['course']}（{'，'.join(parts)}）"
+    parts = [c.location]
+    if c.teacher:
+        parts.append(c.teacher)
+    parts.append(c.type)
+    return f"- {c.time} {c.course}（{'，'.join(parts)}）"
 
 
 def _exec_query_schedule(args: dict) -> str:
     day = args.get("day")
+    keyword = args.get("keyword")
+    index = get_schedule_index()
+    if keyword:
+        courses = [c for c in _search_courses(keyword) if not day or c.weekday == day]
+        where = day or "课表中"
+        if not courses:
+            return f"{where}没有找到与「{keyword}」相关的课程。"
+        lines = [f"{where}与「{keyword}」相关的课程："]
+        for c in courses:
+            lines.append(f"- {c.weekday} {_format_course_line(c)[2:]}")
+        return "\n".join(lines)
     if day:
-        courses = [c for c in get_schedule() if c["weekday"] == day]
+        courses = index.on(day)
         if not courses:
             return f"{day}没有课，可以自由安排！"
         lines = [f"{day}的课程安排："]
@@ -695,35 +851,177 @@ def _exec_query_schedule(args: dict) -> str:
         return "\n".join(lines)
     else:
         # 不指定星期 → 返回整周课表
-        schedule = get_schedule()
-        if not schedule:
+        if not len(index):
             return "课表为空，还没有任何课程。"
-        weekday_order = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
-        grouped = {}
-        for c in schedule:
-            grouped.setdefault(c["weekday"], []).append(c)
         lines = ["本周课表："]
-        for wd in weekday_order:
-            if wd in grouped:
-                lines.append(f"\n📅 {wd}：")
-                for c in grouped[wd]:
-                    lines.append(_format_course_line(c))
+        for wd, courses in index.by_weekday():
+            lines.append(f"\n📅 {wd}：")
+            for c in courses:
+                lines.append(_format_course_line(c))
         return "\n".join(lines)
 
 
+def _exec_check_time_slot(args: dict) -> str:
+    day = args["weekday"]
+    time_str = args["time"]
+    index = get_schedule_index()
+    # 与某门课的时间段完全一致时直接查 (星期, 时间段) 表，否则按区间查重叠
+    clash = index.at(day, time_str)
+    if not clash:
+        interval = parse_interval(time_str)
+        if interval is None:
+            return "时间格式应为「HH:MM」或「HH:MM-HH:MM」，如 14:00 或 14:00-16:00。"
+        clash = index.conflicts(day, *interval)
+    if not clash:
+        return f"{day} {time_str} 没有课，时间空闲。"
+    lines = [f"{day} {time_str} 有课："]
+    for c in clash:
+        lines.append(_format_course_line(c))
+    return "\n".join(lines)
+
+
+def _format_duration(minutes: int) -> str:
+    hours, mins = divmod(minutes, 60)
+    if not hours:
+        return f"{mins} 分钟"
+    return f"{hours} 小时" + (f" {mins} 分钟" if mins else "")
+
+
+def _exec_find_free_slots(args: dict) -> str:
+    day = args.get("weekday")
+    min_minutes = int(args.get("min_minutes") or 60)
+    if min_minutes <= 0:
+        return "min_minutes 须大于 0。"
+    window = parse_interval(f"{args.get('start') or '08:00'}-{args.get('end') or '22:00'}")
+    if window is None:
+        return "start / end 格式应为「HH:MM」，且 end 须晚于 start。"
+    lo, hi = window
+
+    # 未来 7 天（含今天）的具体日期；课表按星期循环，考试与待办截止按日期对应
+    now = datetime.now()
+    today = now.date()
+    dates = [today + timedelta(days=i) for i in range(7)]
+    if day:
+        dates = [d for d in dates if Weekday.from_index(d.weekday()) == day]
+
+    exams_by_date: dict[str, list[dict]] = {}
+    for e in get_upcoming_exams():
+        exams_by_date.setdefault(e["date"], []).append(e)
+    deadlines: dict[str, list] = {}
+    for t in get_todos():
+        if not t.done:
+            deadlines.setdefault(t.deadline, []).append(t)
+
+    index = get_schedule_index()
+    scope = day or "未来 7 天"
+    lines = [f"{scope}不少于 {_format_duration(min_minutes)}的空闲时段（{format_clock(lo)}-{format_clock(hi)}，已避开课程）："]
+    found = 0
+    for d in dates:
+        weekday = Weekday.from_index(d.weekday())
+        # 今天只算当前时刻之后
+        start = max(lo, now.hour * 60 + now.minute) if d == today else lo
+        slots = index.free_slots(weekday, start, hi, min_minutes) if start < hi else []
+        found += len(slots)
+        label = f"{weekday} {d:%m-%d}" + ("（今天）" if d == today else "")
+        free = "、".join(f"{format_clock(s)}-{format_clock(e)}（{_format_duration(e - s)}）" for s, e in slots)
+        lines.append(f"\n📅 {label}：{free or '无'}")
+        for e in exams_by_date.get(d.isoformat(), ()):
+            lines.append(f"  📝 考试：{e['course']}（{e['type']}，{e['location']}）")
+        for t in deadlines.get(d.isoformat(), ()):
+            lines.append(f"  📌 截止：{t.task}（{t.priority}）")
+    if not found:
+        lines.append("\n没有满足条件的空闲时段，可以缩短 min_minutes 或放宽每天的时间范围。")
+    return "\n".join(lines)
+
+
+_OVERVIEW_SECTIONS = ("schedule", "todos", "exams", "health", "finance", "travel")
+_OVERVIEW_DEFAULT_SECTIONS = ("schedule", "todos", "exams", "health", "finance")
+
+
+def _exec_query_overview(args: dict) -> str:
+    sections = args.get("sections") or _OVERVIEW_DEFAULT_SECTIONS
+    sections = [s for s in _OVERVIEW_SECTIONS if s in sections]
+    if not sections:
+        return f"sections 须为 {'、'.join(_OVERVIEW_SECTIONS)} 中的一项或多项。"
+
+    # 所有模块基于同一份数据快照生成，只读盘一次
+    with user_data_snapshot():
+        weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        now = datetime.now()
+        lines = [f"今日概览（{now.strftime('%Y-%m-%d')} {weekday_names[now.weekday()]}）："]
+
+        if "schedule" in sections:
+            courses = get_today_schedule()
+            if courses:
+                items = "；".join(f"{c.time} {c.course}（{c.location}）" for c in courses)
+                lines.append(f"📅 课程：{items}")
+            else:
+                lines.append("📅 课程：今天没有课")
+
+        if "todos" in sections:
+            pending = [t for t in get_todos() if not t.done]
+            urgent = sum(1 for t in pending if "紧急" in t.priority)
+            if pending:
+                items = "；".join(f"[{t.id}]{t.priority} {t.task}（截止 {t.deadline}）" for t in pending)
+                lines.append(f"📝 待办：{len(pending)} 项未完成（{urgent} 项紧急）：{items}")
+            else:
+                lines.append("📝 待办：全部完成")
+
+        if "exams" in sections:
+            exams = get_upcoming_exams()
+            if exams:
+                items = "；".join(
+                    f"{e['course']}{e['type']} {e['date']}（"
+                    + ("今天" if e["days_left"] == 0 else f"还有 {e['days_left']} 天") + "）"
+                    for e in exams
+                )
+                lines.append(f"🎯 考试：{items}")
+            else:
+                lines.append("🎯 考试：近期没有考试")
+
+        if "health" in sections:
+            h = get_health()
+            lines.append(
+                f"🏥 健康：步数 {h['today_steps']:,}/{h['step_goal']:,}｜"
+                f"睡眠 {h['sleep_hours']}h（{h['sleep_quality']}）｜"
+                f"喝水 {h['water_cups']}/{h['water_goal']} 杯｜"
+                f"本周运动 {h['exercise_this_week']}/{h['exercise_goal']} 次｜心情 {h['mood']}"
+            )
+
+        if "finance" in sections:
+            f = get_finance()
+            lines.append(
+                f"💰 财务：已花 ¥{f['spent']:.0f}/¥{f['monthly_budget']:.0f}（{f['budget_usage_pct']}%），"
+                f"剩余 ¥{f['remaining']:.0f}，还剩 {f['days_left_in_month']} 天，建议日限 ¥{f['suggested_daily']:.0f}"
+            )
+
+        if "travel" in sections:
+            travel = get_travel_plan()
+            if travel is None:
+                lines.append("✈️ 旅行：暂无旅行计划")
+            else:
+                lines.append(
+                    f"✈️ 旅行：{travel['trip_name']}，{travel['date']}，"
+                    f"预算 ¥{travel['budget']:.0f}，预估 ¥{travel['total_estimated_cost']:.0f}，"
+                    f"{len(travel['itinerary'])} 个行程站点"
+                )
+
+    return "\n".join(lines)
+
+
 def _exec_query_finance(args: dict) -> str:
     finance = get_finance()
     category = args.get("category")
 
     if category:
         amount = finance["categories"].get(category, 0)
-        txns = [t for t in finance["recent_transactions"] if t["category"] == category]
+        txns = [t for t in finance["recent_transactions"] if t.category == category]
         lines = [f"【{category}】消费情况："]
         lines.append(f"本月 {category} 总计: ¥{amount:.0f}")
         if txns:
             lines.append("相关消费记录：")
             for t in txns[:8]:
-                lines.append(f"- {t['date']} {t['item']} ¥{t['amount']:.1f}")
+                lines.append(f"- {t.date} {t.item} ¥{t.amount:.1f}")
         return "\n".join(lines)
 
     lines = [
@@ -743,7 +1041,7 @@ def _exec_query_finance(args: dict) -> str:
     lines.append("")
     lines.append("最近消费记录：")
     for t in finance["recent_transactions"][:10]:
-        lines.append(f"- {t['date']} {t['item']} ¥{t['amount']:.1f}（{t['category']}）")
+        lines.append(f"- {t.date} {t.item} ¥{t.amount:.1f}（{t.category}）")
 
     return "\n".join(lines)
 
@@ -757,7 +1055,7 @@ def _exec_record_expense(args: dict) -> str:
     if amount <= 0 or amount > 100000:
         return "金额须在 0～100,000 元之间。"
     record = add_expense(item.strip(), amount, category)
-    return f"已记录消费：{item} ¥{amount:.1f}（{category}），记录日期 {record['date']}。"
+    return f"已记录消费：{item} ¥{amount:.1f}（{category}），记录日期 {record.date}。"
 
 
 def _exec_query_health(args: dict) -> str:
@@ -782,10 +1080,10 @@ def _exec_query_todos(args: dict) -> str:
     status = args.get("status", "all")
 
     if status == "pending":
-        todos = [t for t in todos if not t["done"]]
+        todos = [t for t in todos if not t.done]
         title = "未完成的待办事项："
     elif status == "done":
-        todos = [t for t in todos if t["done"]]
+        todos = [t for t in todos if t.done]
         title = "已完成的待办事项："
     else:
         title = "全部待办事项："
@@ -795,8 +1093,8 @@ def _exec_query_todos(args: dict) -> str:
 
     lines = [title]
     for t in todos:
-        status_mark = "✅" if t["done"] else "⬜"
-        lines.append(f"- {status_mark} [{t['id']}] {t['priority']} {t['task']}（截止 {t['deadline']}）")
+        status_mark = "✅" if t.done else "⬜"
+        lines.append(f"- {status_mark} [{t.id}] {t.priority} {t.task}（截止 {t.deadline}）")
     return "\n".join(lines)
 
 
@@ -805,16 +1103,16 @@ def _exec_toggle_todo(args: dict) -> str:
     todos = get_todos()
     target = None
     for t in todos:
-        if t["id"] == task_id:
+        if t.id == task_id:
             target = t
             break
     if not target:
         return f"未找到 ID 为 {task_id} 的待办事项。"
 
-    new_status = not target["done"]
+    new_status = not target.done
     update_todo_status(task_id, new_status)
     status_text = "已完成" if new_status else "未完成"
-    return f"待办「{target['task']}」已标记为{status_text}。"
+    return f"待办「{target.task}」已标记为{status_text}。"
 
 
 def _exec_query_exams(args: dict) -> str:
@@ -856,9 +1154,22 @@ def _exec_query_travel(args: dict) -> str:
         "",
         "行程安排：",
     ]
-    for stop in travel["itinerary"]:
-        cost = f"¥{stop['cost']:.0f}" if stop["cost"] > 0 else "免费"
-        lines.append(f"- {stop['time']} {stop['activity']}（{stop['location']}，{cost}）")
+    itinerary = travel["itinerary"]
+    keyword = args.get("keyword")
+    if keyword:
+        records = ((i, (s.activity, s.location)) for i, s in enumerate(itinerary))
+        idxs = sorted(_itinerary_search.match(keyword, records, source=itinerary))
+        if not idxs:
+            return f"行程中没有找到与「{keyword}」相关的站点。"
+        lines[-1] = f"与「{keyword}」相关的站点："
+        for i in idxs:
+            stop = itinerary[i]
+            cost = f"¥{stop.cost:.0f}" if stop.cost > 0 else "免费"
+            lines.append(f"- [{i+1}] {stop.time} {stop.activity}（{stop.location}，{cost}）")
+        return "\n".join(lines)
+    for stop in itinerary:
+        cost = f"¥{stop.cost:.0f}" if stop.cost > 0 else "免费"
+        lines.append(f"- {stop.time} {stop.activity}（{stop.location}，{cost}）")
 
     lines.append("")
     lines.append("必带清单：" + "、".join(travel["packing_list"]))
@@ -902,11 +1213,11 @@ def _exec_add_todo(args: dict) -> str:
     todo = add_todo(task, deadline, priority, category)
     return (
         f"已新增待办事项：\n"
-        f"- ID: {todo['id']}\n"
-        f"- 任务: {todo['task']}\n"
-        f"- 截止: {todo['deadline']}\n"
-        f"- 优先级: {todo['priority']}\n"
-        f"- 分类: {todo['category']}"
+        f"- ID: {todo.id}\n"
+        f"- 任务: {todo.task}\n"
+        f"- 截止: {todo.deadline}\n"
+        f"- 优先级: {todo.priority}\n"
+        f"- 分类: {todo.category}"
     )
 
 
@@ -928,26 +1239,52 @@ def _exec_record_sleep(args: dict) -> str:
     return f"已记录睡眠：{hours} 小时，质量「{quality}」。"
 
 
-def _find_course_by_name(name: str) -> dict | str | None:
+# 课程 / 行程站点的模糊检索索引（随数据变化增量同步）。
+# 查询（query_schedule / query_travel 的 keyword）按全部字段匹配；定位结果用于删除 / 修改时
+# 只按名称匹配（不看教师、地点），且须明显领先其他名称才直接采用
+_course_search = NgramIndex(weights=(1.0, 0.6, 0.5))   # 课程名、教师、地点
+_itinerary_search = NgramIndex(weights=(1.0, 0.5))     # 活动、地点
+
+
+def _course_records(courses: tuple[Course, ...]):
+    """模糊检索索引的记录：(课程 ID, (课程名, 教师, 地点))。"""
+    return ((c.id, (c.course, c.teacher, c.location)) for c in courses)
+
+
+def _search_courses(keyword: str) -> list[Course]:
+    """按课程名、教师或教室查找课程（只读查询用）：返回得分最高的一档，按星期、时间排序。"""
+    index = get_schedule_index()
+    ids = set(_course_search.match(keyword, _course_records(index.courses), source=index.courses))
+    return [c for _, courses in index.by_weekday() for c in courses if c.id in ids]
+
+
+def _find_course_by_name(name: str) -> Course | str | None:
     """
-    在当前课表中按名称匹配课程。
-    返回: dict（唯一匹配）/ str（多个匹配时返回错误提示）/ None（无匹配）
+    在当前课表中按课程名匹配课程（容忍简称与错别字）。
+    名称基本包含查询且明显领先其他课程时直接采用；简称（如「高数」）、
+    与多门课各有部分重合（如「Python实验」）等不够确定的情况，列出候选请用户确认课程 ID。
+    返回: Course（可直接采用的唯一匹配）/ str（需要确认时的提示）/ None（无匹配）
     """
-    schedule = get_schedule()
-    # 精确匹配
-    for c in schedule:
-        if c["course"] == name:
-            return c
-    # 模糊匹配（搜索词是课程名的子串）
-    matches = [c for c in schedule if name in c["course"]]
-    if len(matches) == 1:
+    index = get_schedule_index()
+    ids, confident = _course_search.match_confident(name, _course_records(index.courses), source=index.courses)
+    matches = [index.get(cid) for cid in ids]
+    if confident:
         return matches[0]
-    if len(matches) > 1:
-        names = "、".join(f"[{c['id']}]{c['course']}" for c in matches)
-        return f"匹配到多门课程：{names}，请指定课程 ID 或更精确的名称。"
+    if matches:
+        names = "、".join(f"[{c.id}]{c.course}" for c in matches)
+        return f"「{name}」可能指：{names}。请向用户确认是哪门课程后，用课程 ID 重试。"
     return None
 
 
+def _course_conflict_message(weekday: str, time: str, clash: list[Course]) -> str:
+    """课程时间冲突的提示：列出冲突课程，并说明如何在用户确认后强制保存。"""
+    lines = [f"{weekday} {time} 与已有课程时间冲突："]
+    for c in clash:
+        lines.append(f"- [{c.id}]{c.course} {c.time}（{c.location}）")
+    lines.append("请换一个时间，或在用户确认需要重叠安排后设 allow_conflict=true 重试。")
+    return "\n".join(lines)
+
+
 def _exec_add_course(args: dict) -> str:
     weekday = args["weekday"]
     time = args["time"]
@@ -955,14 +1292,26 @@ def _exec_add_course(args: dict) -> str:
     location = args["location"]
     teacher = args.get("teacher", "")
     course_type = args.get("type", "选修")
+    interval = parse_interval(time)
+    if interval is None or interval[0] == interval[1]:
+        return "上课时间格式应为「HH:MM-HH:MM」，如 14:00-15:35。"
+    index = get_schedule_index()
+    # 同一时间段已有同名课程：是重复添加，allow_conflict 也不放行
+    duplicate = next((c for c in index.at(weekday, time) if c.course == course), None)
+    if duplicate:
+        return f"{weekday} {time} 已有课程「{course}」(ID={duplicate.id})，无需重复添加。"
+    if not args.get("allow_conflict"):
+        clash = index.conflicts(weekday, *interval)
+        if clash:
+            return _course_conflict_message(weekday, time, clash)
     record = persist_add_course(weekday, time, course, location, teacher, course_type)
     return (
         f"已添加课程：\n"
-        f"- ID: {record['id']}\n"
-        f"- {record['weekday']} {record['time']} {record['course']}\n"
-        f"- 地点: {record['location']}\n"
-        f"- 教师: {record['teacher'] or '未指定'}\n"
-        f"- 类型: {record['type']}"
+        f"- ID: {record.id}\n"
+        f"- {record.weekday} {record.time} {record.course}\n"
+        f"- 地点: {record.location}\n"
+        f"- 教师: {record.teacher or '未指定'}\n"
+        f"- 类型: {record.type}"
     )
 
 
@@ -980,21 +1329,16 @@ def _exec_delete_course(args: dict) -> str:
             return found  # 多个匹配的提示
         if not found:
             return f"未找到名为「{course_name}」的课程。"
-        course_id = found["id"]
+        course_id = found.id
 
     # 统一 int 转换 + 按 ID 验证存在 + 获取规范名称
     course_id = int(course_id)
-    schedule = get_schedule()
-    target = None
-    for c in schedule:
-        if c["id"] == course_id:
-            target = c
-            break
+    target = get_schedule_index().get(course_id)
     if not target:
         return f"未找到 ID 为 {course_id} 的课程。"
 
     persist_delete_course(course_id)
-    return f"已删除课程「{target['course']}」(ID={course_id})。"
+    return f"已删除课程「{target.course}」(ID={course_id})。"
 
 
 def _exec_update_course(args: dict) -> str:
@@ -1008,7 +1352,7 @@ def _exec_update_course(args: dict) -> str:
             if isinstance(found, str):
                 return found
             if found:
-                course_id = found["id"]
+                course_id = found.id
             else:
                 return f"未找到名为「{args['course']}」的课程。"
         else:
@@ -1021,19 +1365,14 @@ def _exec_update_course(args: dict) -> str:
             return found  # 多个匹配的提示
         if not found:
             return f"未找到名为「{course_name}」的课程。"
-        course_id = found["id"]
+        course_id = found.id
 
     # 统一 int 转换 + 按 ID 验证存在 + 获取规范名称
     course_id = int(course_id)
-    schedule = get_schedule()
-    target = None
-    for c in schedule:
-        if c["id"] == course_id:
-            target = c
-            break
+    target = get_schedule_index().get(course_id)
     if not target:
         return f"未找到 ID 为 {course_id} 的课程。"
-    verified_name = target["course"]
+    verified_name = target.course
 
     # 收集要修改的字段（含 course 名称）
     fields = {}
@@ -1044,6 +1383,18 @@ def _exec_update_course(args: dict) -> str:
     if not fields:
         return "没有提供需要修改的字段。请指定要修改的内容（如时间、地点、教师等）。"
 
+    # 改了星期或时间：检查与其他课程是否重叠（排除自身）
+    if "weekday" in fields or "time" in fields:
+        weekday = fields.get("weekday", target.weekday)
+        time = fields.get("time", target.time)
+        interval = parse_interval(time)
+        if interval is None or interval[0] == interval[1]:
+            return "上课时间格式应为「HH:MM-HH:MM」，如 14:00-15:35。"
+        if not args.get("allow_conflict"):
+            clash = get_schedule_index().conflicts(weekday, *interval, exclude=course_id)
+            if clash:
+                return _course_conflict_message(weekday, time, clash)
+
     persist_update_course(course_id, **fields)
     field_names = {"weekday": "星期", "time": "时间", "course": "课程名",
                    "location": "地点", "teacher": "教师", "type": "类型"}
@@ -1118,21 +1469,34 @@ def _exec_add_itinerary_stop(args: dict) -> str:
     icon = args.get("icon", "📍")
     if cost < 0:
         return "花费不能为负数。"
+    interval = parse_interval(time_str)
+    if interval is None:
+        return "时间格式应为「HH:MM」或「HH:MM-HH:MM」，如 14:00 或 14:00-16:00。"
+    # 行程允许重叠（如边逛边吃），只提示不拦截
+    clash = get_itinerary_index(travel["itinerary"]).overlapping(*interval)
     item = persist_add_itinerary(time_str, activity, location, float(cost), icon)
-    cost_str = f"¥{item['cost']:.0f}" if item["cost"] > 0 else "免费"
+    cost_str = f"¥{item.cost:.0f}" if item.cost > 0 else "免费"
     return (
         f"已新增行程站点：\n"
-        f"- 时间: {item['time']}\n"
-        f"- 活动: {item['activity']}\n"
-        f"- 地点: {item['location']}\n"
+        f"- 时间: {item.time}\n"
+        f"- 活动: {item.activity}\n"
+        f"- 地点: {item.location}\n"
         f"- 花费: {cost_str}"
-    )
+    ) + _itinerary_overlap_note(clash)
+
+
+def _itinerary_overlap_note(clash: list) -> str:
+    """行程时间重叠的提示（附加在工具结果末尾），无重叠时为空串。"""
+    if not clash:
+        return ""
+    names = "、".join(f"[{i+1}]{s.activity}（{s.time}）" for i, s in clash)
+    return f"\n⚠️ 与行程站点 {names} 时间重叠，请留意是否来得及。"
 
 
 def _find_itinerary_stop(travel: dict | None, index: int | None, activity_name: str | None):
     """
     在当前行程中定位站点。
-    返回 (real_index, stop_dict) 或 (None, error_str)。
+    返回 (display_index, ItineraryStop) 或 (None, error_str)。
     real_index 是该站点在原始 mock 行程中的索引（用于持久化），对 extra 站点返回负数。
     """
     if travel is None:
@@ -1150,17 +1514,15 @@ def _find_itinerary_stop(travel: dict | None, index: int | None, activity_name:
         return idx, itinerary[idx]
 
     if activity_name:
-        # 精确匹配
-        for i, stop in enumerate(itinerary):
-            if stop["activity"] == activity_name:
-                return i, stop
-        # 模糊匹配
-        matches = [(i, s) for i, s in enumerate(itinerary) if activity_name in s["activity"]]
-        if len(matches) == 1:
+        # 按活动名称模糊匹配（key 为显示序号），不够确定时请用户确认序号
+        records = ((i, (s.activity, s.location)) for i, s in enumerate(itinerary))
+        idxs, confident = _itinerary_search.match_confident(activity_name, records, source=itinerary)
+        matches = [(i, itinerary[i]) for i in idxs]
+        if confident:
             return matches[0]
-        if len(matches) > 1:
-            names = "、".join(f"[{i+1}]{s['activity']}" for i, s in matches)
-            return None, f"匹配到多个站点：{names}，请指定序号。"
+        if matches:
+            names = "、".join(f"[{i+1}]{s.activity}" for i, s in matches)
+            return None, f"「{activity_name}」可能指：{names}。请向用户确认后用站点序号重试。"
         return None, f"未找到包含「{activity_name}」的行程站点。"
 
     return None, "请提供站点序号或活动名称。"
@@ -1202,16 +1564,11 @@ def _exec_delete_itinerary_stop(args: dict) -> str:
         return stop  # error message
 
     real_idx, is_extra = _resolve_itinerary_real_index(travel, display_idx)
-    activity = stop["activity"]
+    activity = stop.activity
 
     if is_extra:
         # 直接从 extra_itinerary 中删除
-        from modules.persistence import load_user_data, save_user_data
-        data = load_user_data()
-        extra = data.get("extra_itinerary", [])
-        if 0 <= real_idx < len(extra):
-            extra.pop(real_idx)
-            save_user_data(data)
+        delete_extra_itinerary_item(real_idx)
     else:
         persist_delete_itinerary(real_idx)
 
@@ -1241,21 +1598,23 @@ def _exec_update_itinerary_stop(args: dict) -> str:
     if "cost" in fields and (not isinstance(fields["cost"], (int, float)) or fields["cost"] < 0):
         return "花费不能为负数。"
 
+    clash = []
+    if "time" in fields:
+        interval = parse_interval(fields["time"])
+        if interval is None:
+            return "时间格式应为「HH:MM」或「HH:MM-HH:MM」，如 14:00 或 14:00-16:00。"
+        clash = [(i, s) for i, s in get_itinerary_index(travel["itinerary"]).overlapping(*interval)
+                 if i != display_idx]
+
     real_idx, is_extra = _resolve_itinerary_real_index(travel, display_idx)
-    original_activity = stop["activity"]
+    original_activity = stop.activity
 
     if is_extra:
-        from modules.persistence import load_user_data, save_user_data
-        data = load_user_data()
-        extra = data.get("extra_itinerary", [])
-        if 0 <= real_idx < len(extra):
-            for k, v in fields.items():
-                extra[real_idx][k] = v
-            save_user_data(data)
+        update_extra_itinerary_item(real_idx, **fields)
     else:
         persist_update_itinerary(real_idx, **fields)
 
     field_names = {"time": "时间", "activity": "活动", "location": "地点",
                    "cost": "花费", "icon": "图标"}
     changes = "、".join(f"{field_names.get(k, k)}→{v}" for k, v in fields.items())
-    return f"已修改行程站点「{original_activity}」：{changes}"
+    return f"已修改行程站点「{original_activity}」：{changes}" + _itinerary_overlap_note(clash)
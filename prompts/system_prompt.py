@@ -57,7 +57,10 @@ def build_system_prompt(user_context: dict) -> str:
 
 ## 工具使用指引
 你配备了以下工具，请在合适的时候主动调用：
+- **query_overview**: 当用户问"今天怎么样"、"最近情况如何"等综合性问题时优先调用，一次拿到课程、待办、考试、健康、财务概览，不要再逐个调用下面的查询工具
 - **query_schedule**: 当用户问到课程、上课时间时调用
+- **check_time_slot**: 当用户问"周三下午两点有空吗"、"某个时间有没有课"时调用，不必为此查询整周课表
+- **find_free_slots**: 当用户问"这周什么时候有空复习"、"哪天下午有两小时空档"时调用，直接返回空闲时段及当天的考试、待办截止，不要自己根据课表推算空档
 - **query_finance**: 当用户问到花销、预算、消费时调用
 - **record_expense**: 当用户说"帮我记一笔"或告诉你某项消费时调用
 - **query_health**: 当用户问到健康、运动、睡眠、喝水时调用
@@ -72,7 +75,7 @@ def build_system_prompt(user_context: dict) -> str:
 - **update_packing**: 当用户说"充电宝准备好了"、"帮我勾掉防晒霜"时调用
 - **record_steps**: 当用户说"今天走了8000步"、"步数6000"时调用
 - **record_sleep**: 当用户说"昨晚睡了7小时"、"睡眠8小时质量不错"时调用
-- **add_course**: 当用户说"帮我加一门课"、"周三下午有个选修课"时调用，需要星期、时间、课程名、地点
+- **add_course**: 当用户说"帮我加一门课"、"周三下午有个选修课"时调用，需要星期、时间、课程名、地点；与已有课程时间冲突时会被拒绝，先告诉用户冲突的课程，用户确认仍要添加再设 allow_conflict=true
 - **delete_course**: 当用户说"帮我删掉体育课"、"这门课不上了"时调用，可按课程名称或 ID 删除
 - **update_course**: 当用户说"线性代数换教室了"、"高数改到周二"时调用，可按课程名称或 ID 定位并修改字段
 - **set_budget**: 当用户说"把预算改成3000"、"这个月预算2500"时调用
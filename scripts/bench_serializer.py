@@ -0,0 +1,80 @@
+"""
+UniLife OS — JSON 序列化后端基准测试
+构造含 1k / 10k / 100k 条消费记录的财务分片，对比各可用后端（orjson / msgspec / json）
+紧凑与缩进两种输出下的保存（序列化 + 写文件）与加载（读文件 + 反序列化）耗时及文件大小。
+
+用法：python scripts/bench_serializer.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import serializer  # noqa: E402
+
+_CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "学习", "生活"]
+_ITEMS = ["奶茶", "食堂午餐", "地铁", "教材", "电影票", "洗发水", "外卖", "打印"]
+
+
+def _finance_section(n: int) -> dict:
+    rng = random.Random(n)
+    return {
+        "extra_transactions": [
+            {
+                "date": f"2026-10-{rng.randint(1, 28):02d}",
+                "item": rng.choice(_ITEMS),
+                "amount": round(rng.uniform(2, 200), 2),
+                "category": rng.choice(_CATEGORIES),
+                "icon": "🍜",
+            }
+            for _ in range(n)
+        ],
+    }
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - began)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="消费记录条数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    print(f"可用后端：{', '.join(serializer.available_backends())}（当前默认 {serializer.BACKEND}）\n")
+    print(f"{'条数':>8}  {'后端':<8}{'格式':<6}{'保存(ms)':>10}{'加载(ms)':>10}{'大小(KB)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "finance.json"
+        for n in args.sizes:
+            data = _finance_section(n)
+            for name in serializer.available_backends():
+                dumps, loads = serializer.get_backend(name)
+                for pretty in (False, True):
+                    def save():
+                        path.write_bytes(dumps(data, pretty))
+
+                    def load():
+                        loads(path.read_bytes())
+
+                    save_ms = _best_of(save, args.repeat)
+                    load_ms = _best_of(load, args.repeat)
+                    size_kb = path.stat().st_size / 1024
+                    fmt = "缩进" if pretty else "紧凑"
+                    print(f"{n:>8}  {name:<8}{fmt:<6}{save_ms:>10.2f}{load_ms:>10.2f}{size_kb:>10.0f}")
+            print()
+
+
+if __name__ == "__main__":
+    main()